@@ -0,0 +1,172 @@
+"""Статистика цен по скинам: медиана, квартили и объём продаж
+
+Сводки строятся одним проходом по сделкам и активным лотам и держатся
+в памяти вместе с отсортированными ценами каждой группы. Новый лот или
+продажа вставляются в свою группу (bisect) и пересчитывают только её;
+полная пересборка — раз в interval секунд (в режиме webhook с несколькими
+воркерами она же подтягивает продажи из других процессов).
+"""
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+
+# Рекомендация по продажам — только если их не меньше MIN_SALES, иначе по активным лотам
+MIN_SALES = 3
+QUANTILES = (0.25, 0.5, 0.75)
+
+def skin_key(skin_name, quality):
+    """Ключ группы: название и качество без учёта регистра и пробелов по краям"""
+    return (skin_name or '').strip().lower(), (quality or '').strip().lower()
+
+def _quantile(ordered, q):
+    """Квантиль отсортированного списка с линейной интерполяцией (как numpy.quantile)"""
+    position = q * (len(ordered) - 1)
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+def summarize(ordered):
+    """Сводка группы по отсортированным ценам: (число, p25, медиана, p75)"""
+    return (len(ordered), *(_quantile(ordered, q) for q in QUANTILES))
+
+def group_prices(rows, names):
+    """{ключ: отсортированные цены} из строк (skin_name, quality, цена).
+    В names запоминается написание группы для показа"""
+    groups = {}
+    for skin_name, quality, price in rows:
+        key = skin_key(skin_name, quality)
+        prices = groups.get(key)
+        if prices is None:
+            prices = groups[key] = []
+            names.setdefault(key, (skin_name, quality))
+        prices.append(price)
+    for prices in groups.values():
+        prices.sort()
+    return groups
+
+class PriceAnalytics:
+    """Кэш сводок цен по (скин, качество)"""
+
+    def __init__(self, pool, interval=3600):
+        self.pool = pool
+        self.interval = interval
+        self.sales = {}
+        self.asks = {}
+        # Отсортированные цены групп для пересчёта одной группы
+        self._sale_prices = {}
+        self._ask_prices = {}
+        # Ключ -> (skin_name, quality) в исходном написании
+        self.names = {}
+        self._top = None
+        self.ready = False
+        self._task = None
+        self._stopped = None
+
+    async def rebuild(self):
+        """Полная пересборка: два запроса и пакетный расчёт"""
+        async with self.pool.reader() as db:
+            # Сделка и её лот всегда в одном ярусе (archive.COLD): горячие и архивные отдельно
+            cursor = await db.execute('''
+                SELECT l.skin_name, l.quality, t.amount_usd
+                FROM transactions t
+                JOIN listings l ON l.id = t.listing_id
+                WHERE t.amount_usd IS NOT NULL
+                UNION ALL
+                SELECT l.skin_name, l.quality, t.amount_usd
+                FROM transactions_archive t
+                JOIN listings_archive l ON l.id = t.listing_id
+                WHERE t.amount_usd IS NOT NULL
+            ''')
+            sales = await cursor.fetchall()
+            cursor = await db.execute('''
+                SELECT skin_name, quality, price_usd FROM listings
+                WHERE status = 'active' AND price_usd IS NOT NULL
+            ''')
+            asks = await cursor.fetchall()
+
+        names = {}
+        self._sale_prices = group_prices(sales, names)
+        self._ask_prices = group_prices(asks, names)
+        self.names = names
+        self.sales = {key: summarize(prices) for key, prices in self._sale_prices.items()}
+        self.asks = {key: summarize(prices) for key, prices in self._ask_prices.items()}
+        self._top = None
+        self.ready = True
+
+    def add_ask(self, skin_name, quality, price):
+        """Новый лот выставлен на продажу"""
+        if not self.ready:
+            return
+        key = skin_key(skin_name, quality)
+        self.names.setdefault(key, (skin_name, quality))
+        prices = self._ask_prices.setdefault(key, [])
+        bisect.insort(prices, price)
+        self.asks[key] = summarize(prices)
+
+    def record_sale(self, skin_name, quality, price):
+        """Лот продан: цена уходит из активных в продажи"""
+        if not self.ready:
+            return
+        key = skin_key(skin_name, quality)
+        asks = self._ask_prices.get(key)
+        position = bisect.bisect_left(asks, price) if asks else 0
+        if asks and position < len(asks) and asks[position] == price:
+            del asks[position]
+            if asks:
+                self.asks[key] = summarize(asks)
+            else:
+                del self._ask_prices[key]
+                self.asks.pop(key, None)
+        prices = self._sale_prices.setdefault(key, [])
+        bisect.insort(prices, price)
+        self.sales[key] = summarize(prices)
+        self._top = None
+
+    def summary(self, skin_name, quality):
+        """(продажи, активные лоты): сводки группы или None"""
+        key = skin_key(skin_name, quality)
+        return self.sales.get(key), self.asks.get(key)
+
+    def suggested_price(self, skin_name, quality):
+        """Рекомендуемая цена: медиана продаж, а при малом их числе — медиана активных лотов.
+        Возвращает (цена, сводка, источник) или None"""
+        sales, asks = self.summary(skin_name, quality)
+        if sales and sales[0] >= MIN_SALES:
+            return sales[2], sales, 'sales'
+        if asks:
+            return asks[2], asks, 'asks'
+        if sales:
+            return sales[2], sales, 'sales'
+        return None
+
+    def top(self, count=10):
+        """Самые продаваемые скины: [((skin_name, quality), сводка продаж)]"""
+        if self._top is None or self._top[0] != count:
+            best = heapq.nlargest(count, self.sales.items(), key=lambda item: item[1][0])
+            self._top = count, [(self.names.get(key, key), summary) for key, summary in best]
+        return self._top[1]
+
+    async def _run(self):
+        while not self._stopped.is_set():
+            try:
+                await self.rebuild()
+            except Exception:
+                logging.exception("price analytics rebuild failed")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Построить сводки в фоне (старт бота их не ждёт) и пересобирать раз в interval"""
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
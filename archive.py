@@ -0,0 +1,155 @@
+"""Архив холодных строк: старые сделки, проданные лоты и доставленные уведомления
+
+Строки переносятся в таблицы *_archive того же файла небольшими пачками,
+каждая — своя короткая транзакция писателя. Горячие таблицы и их индексы
+остаются маленькими и помещаются в кэш страниц. Отдельный файл через ATTACH
+не используется: в режиме WAL транзакция по двум файлам не атомарна,
+и строка могла бы пропасть или задвоиться при сбое посреди переноса.
+В тихие периоды свободные страницы возвращаются incremental vacuum.
+"""
+import asyncio
+import json
+import logging
+
+# Колонки переносимых таблиц: архив не зависит от их порядка в горячей таблице
+COLUMNS = {
+    'transactions': (
+        'id', 'listing_id', 'buyer_id', 'seller_id', 'amount_usd', 'status',
+        'created_at', 'completed_at', 'buyer_rating', 'seller_rating',
+    ),
+    'listings': (
+        'id', 'seller_id', 'skin_name', 'quality', 'price_usd', 'price_rub', 'steam_link',
+        'image_url', 'float_value', 'pattern', 'status', 'views', 'created_at',
+    ),
+    'notifications': ('id', 'user_id', 'type', 'title', 'message', 'data', 'is_read', 'created_at'),
+}
+
+# Выбор холодных строк (по индексам миграции 9). Параметры: возраст вида '-30 days', лимит.
+# Сделки переносятся раньше лотов: лот уходит в архив только без сделки в горячей таблице,
+# поэтому сделка и её лот всегда лежат в одном ярусе
+COLD = {
+    'transactions': '''
+        SELECT id FROM transactions WHERE created_at < datetime('now', ?) LIMIT ?
+    ''',
+    'listings': '''
+        SELECT id FROM listings
+        WHERE status != 'active' AND created_at < datetime('now', ?)
+          AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.listing_id = listings.id)
+        LIMIT ?
+    ''',
+    'notifications': '''
+        SELECT id FROM notifications WHERE is_read != 0 AND created_at < datetime('now', ?) LIMIT ?
+    ''',
+}
+
+# PRAGMA auto_vacuum: 2 — INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+class Archiver:
+    """Фоновый перенос холодных строк в архив и возврат свободных страниц"""
+
+    def __init__(self, pool, after_days=30, batch=1000, interval=300, vacuum_pages=500, quiet_writes=1.0):
+        self.pool = pool
+        self.after_days = after_days
+        self.batch = batch
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        # Период тихий, если записей меньше quiet_writes в секунду
+        self.quiet_writes = quiet_writes
+        self.stats = {'archived': 0, 'vacuumed_pages': 0}
+        self._incremental = None
+        self._task = None
+        self._stopped = None
+
+    def _stopping(self):
+        return self._stopped is not None and self._stopped.is_set()
+
+    async def archive_batch(self, table):
+        """Перенести одну пачку холодных строк таблицы. Возвращает их число"""
+        columns = ', '.join(COLUMNS[table])
+        async with self.pool.writer() as db:
+            cursor = await db.execute(COLD[table], (f'-{self.after_days} days', self.batch))
+            ids = [row[0] for row in await cursor.fetchall()]
+            if not ids:
+                return 0
+            batch = json.dumps(ids)
+            await db.execute(f'''
+                INSERT INTO {table}_archive ({columns})
+                SELECT {columns} FROM {table} WHERE id IN (SELECT value FROM json_each(?))
+            ''', (batch,))
+            cursor = await db.execute(
+                f'DELETE FROM {table} WHERE id IN (SELECT value FROM json_each(?))', (batch,)
+            )
+            moved = cursor.rowcount
+        self.stats['archived'] += moved
+        return moved
+
+    async def archive(self):
+        """Перенести все холодные строки пачками. Возвращает {таблица: строк}"""
+        moved = {}
+        for table in COLUMNS:
+            moved[table] = 0
+            while not self._stopping():
+                count = await self.archive_batch(table)
+                moved[table] += count
+                if count < self.batch:
+                    break
+        return moved
+
+    async def vacuum(self):
+        """Вернуть свободные страницы файлу порциями по vacuum_pages, пока нет очереди записи"""
+        if self._incremental is None:
+            async with self.pool.reader() as db:
+                cursor = await db.execute('PRAGMA auto_vacuum')
+                self._incremental = (await cursor.fetchone())[0] == AUTO_VACUUM_INCREMENTAL
+            if not self._incremental:
+                logging.info("auto_vacuum is not incremental: run `python -m bot.maintenance vacuum` once")
+        if not self._incremental:
+            return 0
+
+        freed = 0
+        while not self.pool.pending_writes and not self._stopping():
+            async with self.pool.writer() as db:
+                cursor = await db.execute('PRAGMA freelist_count')
+                pages = min((await cursor.fetchone())[0], self.vacuum_pages)
+                if pages:
+                    # Один execute освобождает одну страницу; executemany делает их все за один вызов
+                    await db.executemany('PRAGMA incremental_vacuum(1)', [()] * pages)
+            if not pages:
+                break
+            freed += pages
+        self.stats['vacuumed_pages'] += freed
+        return freed
+
+    async def _run(self):
+        writes = self.pool.stats['writes']
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                break
+            # Нагрузка за прошедший интервал, без учёта записей самого архиватора
+            rate = (self.pool.stats['writes'] - writes) / self.interval
+            try:
+                moved = await self.archive()
+                if any(moved.values()):
+                    logging.info("archived %s", moved)
+                if rate < self.quiet_writes:
+                    await self.vacuum()
+            except Exception:
+                logging.exception("archival failed")
+            writes = self.pool.stats['writes']
+
+    def start(self):
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановить архиватор (текущая пачка дописывается)"""
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
@@ -0,0 +1,74 @@
+"""Статистика цен: запрос к БД на каждую подсказку против сводок в памяти
+
+Запуск: python -m bot.benchmarks.bench_analytics --listings 300000 --skins 2000
+"""
+import argparse
+import asyncio
+import random
+
+from ..analytics import summarize
+from ..database import pool, analytics
+from .common import temp_db, seed, report, Timer
+
+async def sql_suggestion(skin_name, quality):
+    """Старый способ: цены продаж группы из БД и квантили на каждый запрос"""
+    async with pool.reader() as db:
+        cursor = await db.execute('''
+            SELECT t.amount_usd FROM transactions t
+            JOIN listings l ON l.id = t.listing_id
+            WHERE l.skin_name = ? AND l.quality = ?
+            ORDER BY t.amount_usd
+        ''', (skin_name, quality))
+        prices = [row[0] for row in await cursor.fetchall()]
+    return summarize(prices) if prices else None
+
+async def main(args):
+    async with temp_db():
+        await seed(users=1000, listings=args.listings, names=lambda i: f'Skin {i % args.skins}')
+        # Половина лотов продана
+        async with pool.writer() as db:
+            await db.execute("UPDATE listings SET status = 'sold' WHERE id % 2 = 0")
+            await db.execute('''
+                INSERT INTO transactions (listing_id, buyer_id, seller_id, amount_usd, status)
+                SELECT id, 1, seller_id, price_usd, 'completed' FROM listings WHERE status = 'sold'
+            ''')
+
+        with Timer() as t:
+            await analytics.rebuild()
+        report('rebuild', args.listings, t.elapsed)
+
+        names = [f'Skin {random.randrange(args.skins)}' for _ in range(args.requests)]
+
+        with Timer() as t:
+            for name in names[:args.sql]:
+                await sql_suggestion(name, 'Field-Tested')
+        report('sql per request', args.sql, t.elapsed)
+
+        with Timer() as t:
+            for name in names:
+                analytics.suggested_price(name, 'Field-Tested')
+        report('suggested_price', len(names), t.elapsed)
+
+        with Timer() as t:
+            for name in names:
+                analytics.record_sale(name, 'Field-Tested', random.randint(1, 100))
+        report('record_sale', len(names), t.elapsed)
+
+        with Timer() as t:
+            for _ in range(args.requests):
+                analytics.top(10)
+        report('top (cached)', args.requests, t.elapsed)
+
+        # Проверка: сводки в памяти совпадают с расчётом по БД
+        await analytics.rebuild()
+        for name in names[:100]:
+            sales, _ = analytics.summary(name, 'Field-Tested')
+            assert sales == await sql_suggestion(name, 'Field-Tested')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--listings', type=int, default=300_000)
+    parser.add_argument('--skins', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=10_000)
+    parser.add_argument('--sql', type=int, default=500, help='запросов для прогона через БД')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""Архив холодных строк: скорость переноса, размер горячих таблиц и чтение из архива
+
+Запуск: python -m bot.benchmarks.bench_archive --listings 300000
+"""
+import argparse
+import asyncio
+
+from ..database import pool, archiver, analytics, check_stats, get_listing
+from .common import temp_db, seed, report, Timer
+
+async def table_pages(db, table):
+    """Страниц в таблице и её индексах (по dbstat, если SQLite собран с ним)"""
+    try:
+        cursor = await db.execute(
+            'SELECT COUNT(*) FROM dbstat WHERE name = ? OR name IN '
+            '(SELECT name FROM sqlite_master WHERE type = ? AND tbl_name = ?)',
+            (table, 'index', table)
+        )
+        return (await cursor.fetchone())[0]
+    except Exception:
+        return None
+
+async def sizes():
+    async with pool.reader() as db:
+        result = {}
+        for table in ('listings', 'transactions', 'notifications'):
+            cursor = await db.execute(f'SELECT COUNT(*) FROM {table}')
+            result[table] = ((await cursor.fetchone())[0], await table_pages(db, table))
+        cursor = await db.execute('PRAGMA page_count')
+        result['file pages'] = (await cursor.fetchone())[0]
+    return result
+
+async def main(args):
+    async with temp_db():
+        await seed(users=1000, listings=args.listings)
+        # Лоты созданы «раз в минуту» в прошлом: старшие args.sold проданы
+        sold = int(args.listings * args.sold)
+        async with pool.writer() as db:
+            await db.execute("UPDATE listings SET status = 'sold' WHERE id <= ?", (sold,))
+            await db.execute('''
+                INSERT INTO transactions (listing_id, buyer_id, seller_id, amount_usd, status, created_at)
+                SELECT id, 1, seller_id, price_usd, 'completed', created_at FROM listings WHERE status = 'sold'
+            ''')
+            await db.execute('''
+                INSERT INTO notifications (user_id, type, title, message, is_read, created_at)
+                SELECT seller_id, 'sale', 'sold', 'sold', 1, created_at FROM listings WHERE status = 'sold'
+            ''')
+        await check_stats()
+        print('before', await sizes())
+
+        with Timer() as t:
+            moved = await archiver.archive()
+        report('archive', sum(moved.values()), t.elapsed)
+        print('moved', moved)
+
+        with Timer() as t:
+            freed = await archiver.vacuum()
+        report('incremental vacuum', max(freed, 1), t.elapsed)
+        print('after', await sizes())
+
+        with Timer() as t:
+            for listing_id in range(1, args.lookups + 1):
+                assert await get_listing(listing_id) is not None
+        report('get_listing (archive)', args.lookups, t.elapsed)
+
+        with Timer() as t:
+            for listing_id in range(args.listings - args.lookups + 1, args.listings + 1):
+                await get_listing(listing_id)
+        report('get_listing (hot)', args.lookups, t.elapsed)
+
+        # Сводки цен и счётчики stats учитывают архив
+        await analytics.rebuild()
+        assert sum(summary[0] for summary in analytics.sales.values()) == sold
+        assert await check_stats(fix=False) == {}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--listings', type=int, default=300_000)
+    parser.add_argument('--sold', type=float, default=0.8, help='доля проданных лотов')
+    parser.add_argument('--lookups', type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
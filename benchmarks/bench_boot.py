@@ -0,0 +1,59 @@
+"""Холодный старт: импорт, startup (схема БД, прогрев пула, get_me) и первый апдейт
+
+Запуск: python -m bot.benchmarks.bench_boot
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from ..boot import create_dispatcher
+from ..database import pool, rates
+from ..rates import StaticRateSource
+from .fake_telegram import StubSession, TOKEN, message_update
+
+def import_time(package):
+    """Время импорта boot в новом процессе (aiogram, обработчики, БД)"""
+    code = f'import time; t = time.perf_counter(); import {package}.boot; print(time.perf_counter() - t)'
+    return float(subprocess.check_output([sys.executable, '-c', code], text=True))
+
+async def boot(dp, update_id):
+    """Старт диспетчера, один /start и остановка. Возвращает (startup, первый апдейт) в секундах"""
+    bot = Bot(token=TOKEN, session=StubSession())
+    started = time.perf_counter()
+    await dp.emit_startup(bot=bot)
+    ready = time.perf_counter()
+    await dp.feed_update(bot, Update.model_validate(message_update(update_id, update_id, '/start')))
+    handled = time.perf_counter()
+    await dp.emit_shutdown(bot=bot)
+    return ready - started, handled - ready
+
+async def main(args):
+    old_path = pool.path
+    with tempfile.TemporaryDirectory() as tmp:
+        await pool.close()
+        pool.path = os.path.join(tmp, 'boot.db')
+        # Курс без сети: startup не ждёт внешний сервис, замеры повторяемы
+        rates.source = StaticRateSource(90.0)
+        # Роутер подключается к одному диспетчеру: он переживает несколько стартов
+        dp = create_dispatcher(0, throttle=False)
+        try:
+            for i, name in enumerate(('new database', 'existing schema', 'existing schema')):
+                startup, first = await boot(dp, i + 1)
+                print(f'{name:<16} startup {startup * 1000:7.1f} ms  first update {first * 1000:6.1f} ms')
+        finally:
+            await pool.close()
+            pool.path = old_path
+    if args.imports:
+        print(f'import boot      {import_time(__package__.split(".")[0]) * 1000:7.1f} ms')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--no-imports', dest='imports', action='store_false', help='не мерить импорт')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,40 @@
+"""Массовое начисление: по одному UPDATE на транзакцию против пачек executemany
+
+Запуск: python -m bot.benchmarks.bench_bulk --users 100000 --single 2000
+"""
+import argparse
+import asyncio
+
+from ..database import update_balance, bulk_update_balance, bulk_activate_vip
+from .common import temp_db, seed, report, Timer
+
+async def main(args):
+    async with temp_db():
+        await seed(users=args.users, listings=0)
+        items = [(user_id, 10) for user_id in range(1, args.users + 1)]
+
+        # Старый способ слишком медленный для всех пользователей: меряем часть
+        with Timer() as t:
+            for user_id, amount in items[:args.single]:
+                await update_balance(user_id, amount)
+        report('update_balance', args.single, t.elapsed)
+
+        chunks = []
+
+        async def progress(done, total):
+            chunks.append(done)
+
+        with Timer() as t:
+            updated = await bulk_update_balance(items, progress)
+        report('bulk_update_balance', updated, t.elapsed)
+
+        with Timer() as t:
+            updated = await bulk_activate_vip([(user_id, 30) for user_id, _ in items])
+        report('bulk_activate_vip', updated, t.elapsed)
+        print(f'progress reports: {len(chunks)}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--single', type=int, default=2000, help='пользователей для поштучного прогона')
+    asyncio.run(main(parser.parse_args()))
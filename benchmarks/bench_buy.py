@@ -0,0 +1,85 @@
+"""Стресс-тест покупок: тысячи одновременных buy_listing на временной БД
+
+Запуск: python -m bot.benchmarks.bench_buy --buys 5000 --processes 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+
+from ..database import pool, buy_listing
+from .common import temp_db, seed, report, Timer
+
+async def _buy_many(buys, users, listings):
+    """Покупки случайных лотов случайными покупателями"""
+    results = await asyncio.gather(*(
+        buy_listing(random.randint(1, listings), random.randint(1, users))
+        for _ in range(buys)
+    ))
+    stats = dict(pool.stats)
+    stats['sold'] = sum(1 for ok, _ in results if ok)
+    await pool.close()
+    return stats
+
+def _worker(path, buys, users, listings):
+    pool.path = path
+    return asyncio.run(_buy_many(buys, users, listings))
+
+async def check(users, balance):
+    """Инварианты: лот продан не более одного раза, балансы сходятся"""
+    async with pool.reader() as db:
+        cursor = await db.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT listing_id FROM transactions GROUP BY listing_id HAVING COUNT(*) > 1
+            )
+        ''')
+        sold_twice = (await cursor.fetchone())[0]
+        cursor = await db.execute('SELECT COUNT(*) FROM users WHERE balance_coins < 0')
+        negative = (await cursor.fetchone())[0]
+        cursor = await db.execute('SELECT SUM(balance_coins) FROM users')
+        total = (await cursor.fetchone())[0]
+        cursor = await db.execute("SELECT COUNT(*) FROM listings WHERE status = 'sold'")
+        sold = (await cursor.fetchone())[0]
+        cursor = await db.execute('SELECT COUNT(*) FROM transactions')
+        transactions = (await cursor.fetchone())[0]
+    print(f'sold listings: {sold}, transactions: {transactions}')
+    print(f'sold twice: {sold_twice}, negative balances: {negative}, '
+          f'coins conserved: {total == users * balance}')
+    return sold_twice == 0 and negative == 0 and sold == transactions and total == users * balance
+
+async def main(args):
+    async with temp_db() as path:
+        await seed(users=args.users, listings=args.listings, balance=args.balance)
+        await pool.close()
+
+        per_process = args.buys // args.processes
+        ctx = multiprocessing.get_context('spawn')
+        with Timer() as t:
+            with ctx.Pool(args.processes) as workers:
+                stats = workers.starmap(
+                    _worker,
+                    [(path, per_process, args.users, args.listings)] * args.processes
+                )
+
+        report('buy_listing', per_process * args.processes, t.elapsed)
+        # lock_wait копится по всем выданным соединениям (requests), в том числе
+        # по покупкам, откатившимся с PurchaseError; writes — только закоммиченные
+        requests = sum(s['requests'] for s in stats)
+        writes = sum(s['writes'] for s in stats)
+        transactions = sum(s['transactions'] for s in stats)
+        lock_wait = sum(s['lock_wait'] for s in stats)
+        print(f'lock wait: sum {lock_wait:.3f} s, avg {lock_wait / requests * 1000:.3f} ms per request '
+              f'({requests} requests, {writes} committed, {transactions} transactions)')
+        print(f'busy retries: {sum(s["busy_retries"] for s in stats)}')
+        ok = await check(args.users, args.balance)
+    print('OK' if ok else 'FAILED')
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--buys', type=int, default=5000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--listings', type=int, default=2000)
+    parser.add_argument('--balance', type=int, default=200)
+    raise SystemExit(0 if asyncio.run(main(parser.parse_args())) else 1)
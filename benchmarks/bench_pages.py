@@ -0,0 +1,55 @@
+"""Пагинация по ключу (created_at, id) против OFFSET на большом каталоге
+
+Запуск: python -m bot.benchmarks.bench_pages --listings 1000000 --pages 500
+"""
+import argparse
+import asyncio
+
+from ..database import pool, get_active_listings
+from ..handlers import PAGE_SIZE
+from .common import temp_db, seed, Timer
+
+async def offset_page(page):
+    """Старый способ: OFFSET растёт с номером страницы"""
+    async with pool.reader() as db:
+        cursor = await db.execute('''
+            SELECT l.*, u.username as seller_name, u.rating
+            FROM listings l
+            JOIN users u ON l.seller_id = u.user_id
+            WHERE l.status = 'active'
+            ORDER BY l.created_at DESC, l.id DESC
+            LIMIT ? OFFSET ?
+        ''', (PAGE_SIZE, page * PAGE_SIZE))
+        return await cursor.fetchall()
+
+async def timed(coro, repeat):
+    with Timer() as t:
+        for _ in range(repeat):
+            await coro()
+    return t.elapsed / repeat * 1000
+
+async def main(args):
+    async with temp_db():
+        print(f'seeding {args.listings} listings...')
+        await seed(users=args.users, listings=args.listings)
+
+        # Доходим до последней страницы, запоминая ключ каждой
+        keys = [None]
+        rows = await get_active_listings(PAGE_SIZE)
+        for _ in range(args.pages - 1):
+            last = rows[-1]
+            keys.append((last['created_at'], last['id']))
+            rows = await get_active_listings(PAGE_SIZE, after=keys[-1])
+
+        for page in (0, args.pages // 10, args.pages - 1):
+            keyset = await timed(lambda: get_active_listings(PAGE_SIZE, after=keys[page]), args.repeat)
+            offset = await timed(lambda: offset_page(page), args.repeat)
+            print(f'page {page + 1:>6}: keyset {keyset:8.3f} ms   offset {offset:8.3f} ms')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--listings', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""Сравнение: соединение на каждый запрос против общего пула
+
+Запуск: python -m bot.benchmarks.bench_pool
+"""
+import argparse
+import asyncio
+import random
+
+import aiosqlite
+
+from ..database import pool, get_user, get_active_listings
+from .common import temp_db, seed, report, Timer
+
+async def handle_update_old(path, user_id):
+    """Апдейт как раньше: новое соединение на каждый запрос"""
+    async with aiosqlite.connect(path) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        await cursor.fetchone()
+    async with aiosqlite.connect(path) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute('''
+            SELECT l.*, u.username as seller_name, u.rating
+            FROM listings l
+            JOIN users u ON l.seller_id = u.user_id
+            WHERE l.status = 'active'
+            ORDER BY l.created_at DESC
+            LIMIT 5
+        ''')
+        await cursor.fetchall()
+
+async def handle_update_pool(path, user_id):
+    """Тот же апдейт через пул"""
+    await get_user(user_id)
+    await get_active_listings(5)
+
+async def run(handler, path, updates, concurrency, users):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await handler(path, random.randint(1, users))
+
+    with Timer() as t:
+        await asyncio.gather(*(one() for _ in range(updates)))
+    return t.elapsed
+
+async def main(args):
+    async with temp_db() as path:
+        await seed(users=args.users, listings=args.listings)
+        await pool.open()
+        old = await run(handle_update_old, path, args.updates, args.concurrency, args.users)
+        new = await run(handle_update_pool, path, args.updates, args.concurrency, args.users)
+    report('connect per query', args.updates, old)
+    report('pool', args.updates, new)
+    print(f'speedup: x{old / new:.1f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--listings', type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
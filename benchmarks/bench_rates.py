@@ -0,0 +1,52 @@
+"""Пересчёт price_rub при смене курса: UPDATE по диапазонам id против построчного
+
+Запуск: python -m bot.benchmarks.bench_rates --listings 1000000
+"""
+import argparse
+import asyncio
+
+from ..database import pool, rates
+from ..rates import StaticRateSource
+from .common import temp_db, seed, report, Timer
+
+async def row_by_row(rate):
+    """Старый способ: прочитать лоты и обновить каждый по отдельности"""
+    async with pool.reader() as db:
+        cursor = await db.execute("SELECT id, price_usd FROM listings WHERE status = 'active'")
+        rows = await cursor.fetchall()
+    async with pool.writer() as db:
+        await db.executemany(
+            'UPDATE listings SET price_rub = ? WHERE id = ?',
+            [(round(price_usd * rate), listing_id) for listing_id, price_usd in rows]
+        )
+    return len(rows)
+
+async def main(args):
+    async with temp_db():
+        await seed(users=1000, listings=args.listings)
+        rates.source = StaticRateSource(90.0)
+
+        with Timer() as t:
+            count = await row_by_row(90.0)
+        report('row by row', count, t.elapsed)
+
+        with Timer() as t:
+            count = await rates.set_rate(91.5)
+        report('set_rate (chunked)', count, t.elapsed)
+
+        with Timer() as t:
+            count = await rates.set_rate(91.5)
+        report('same rate (no-op)', max(count, 1), t.elapsed)
+
+        # Проверка: рубли соответствуют новому курсу
+        async with pool.reader() as db:
+            cursor = await db.execute('''
+                SELECT COUNT(*) FROM listings
+                WHERE status = 'active' AND price_rub != CAST(ROUND(price_usd * 91.5) AS INTEGER)
+            ''')
+            assert (await cursor.fetchone())[0] == 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--listings', type=int, default=1_000_000)
+    asyncio.run(main(parser.parse_args()))
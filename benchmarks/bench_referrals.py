@@ -0,0 +1,63 @@
+"""Экран рефералов у топ-реферера: COUNT(*) на каждое нажатие против счётчиков и кэша дерева
+
+Запуск: python -m bot.benchmarks.bench_referrals --invitees 50000
+"""
+import argparse
+import asyncio
+
+from ..database import pool, create_user, get_user, referral_stats, user_cache
+from .common import temp_db, report, Timer
+
+async def main(args):
+    async with temp_db():
+        # Дерево: 1 -> invitees прямых, у каждого десятого ещё по 3 реферала
+        async with pool.writer() as db:
+            await db.execute("INSERT INTO users (user_id, username, referrer_id) VALUES (1, 'top', NULL)")
+            await db.executemany(
+                'INSERT INTO users (user_id, username, referrer_id) VALUES (?, ?, 1)',
+                ((i, f'user{i}') for i in range(2, args.invitees + 2))
+            )
+            next_id = args.invitees + 2
+            rows = []
+            for parent in range(2, args.invitees + 2, 10):
+                for _ in range(3):
+                    rows.append((next_id, f'user{next_id}', parent))
+                    next_id += 1
+            await db.executemany('INSERT INTO users (user_id, username, referrer_id) VALUES (?, ?, ?)', rows)
+
+        with Timer() as t:
+            for _ in range(args.taps):
+                async with pool.reader() as db:
+                    cursor = await db.execute('SELECT COUNT(*) FROM users WHERE referrer_id = ?', (1,))
+                    await cursor.fetchone()
+        report('COUNT(*) per tap', args.taps, t.elapsed)
+
+        with Timer() as t:
+            await referral_stats.levels(1)
+        report('tree CTE (cold)', 1, t.elapsed)
+
+        with Timer() as t:
+            for _ in range(args.taps):
+                await get_user(1)
+                await referral_stats.levels(1)
+        report('row + cached tree', args.taps, t.elapsed)
+
+        with Timer() as t:
+            for i in range(args.signups):
+                await create_user(next_id + i, 'new', 'New', 2 + i)
+        report('create_user (referral)', args.signups, t.elapsed)
+
+        # Проверка: инкрементальные уровни совпадают с полным обходом
+        cached = list(await referral_stats.levels(1))
+        referral_stats.cache.clear()
+        assert cached == await referral_stats.levels(1), cached
+        user_cache.clear()
+        assert (await get_user(1))['referral_count'] == args.invitees
+        print(f'levels: {cached}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--invitees', type=int, default=50_000)
+    parser.add_argument('--taps', type=int, default=1000)
+    parser.add_argument('--signups', type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,130 @@
+"""CPU на рендер одного обновления: прежние функции против шаблонов и кэша клавиатур
+
+Запуск: python -m bot.benchmarks.bench_render --repeat 20000
+"""
+import argparse
+import timeit
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from ..handlers import PAGE_SIZE
+from ..keyboards import get_listings_keyboard, get_listing_detail_keyboard, get_back_keyboard
+from ..rendering import render_listings_page, render_listing
+from ..utils import encode_cursor, escape_markdown
+
+# ---------- Прежняя реализация ----------
+
+def old_escape_markdown(text):
+    chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in chars:
+        text = text.replace(char, f'\\{char}')
+    return text
+
+def old_back_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="◀ Назад", callback_data="main_menu")]
+    ])
+
+def old_listings_keyboard(listings, page=0, has_next=True):
+    builder = InlineKeyboardBuilder()
+    for listing in listings:
+        builder.row(InlineKeyboardButton(
+            text=f"{listing['skin_name']} - ${listing['price_usd']}",
+            callback_data=f"view_{listing['id']}"
+        ))
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton(
+            text="◀", callback_data=f"page_{page-1}_p_{encode_cursor(listings[0])}"
+        ))
+    nav_buttons.append(InlineKeyboardButton(text="📊", callback_data="stats"))
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton(
+            text="▶", callback_data=f"page_{page+1}_n_{encode_cursor(listings[-1])}"
+        ))
+    builder.row(*nav_buttons)
+    builder.row(InlineKeyboardButton(text="◀ Назад", callback_data="main_menu"))
+    return builder.as_markup()
+
+def old_detail_keyboard(listing_id):
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="💰 Купить", callback_data=f"buy_{listing_id}"),
+        InlineKeyboardButton(text="📞 Спросить", callback_data=f"ask_{listing_id}")
+    )
+    builder.row(InlineKeyboardButton(text="◀ Назад к списку", callback_data="listings"))
+    return builder.as_markup()
+
+def old_listings_text(listings, page):
+    text = "**📋 ДОСТУПНЫЕ СКИНЫ**\n\n"
+    for i, item in enumerate(listings, page * PAGE_SIZE + 1):
+        text += f"{i}. **{item['skin_name']}** ({item['quality']})\n"
+        text += f"   💰 ${item['price_usd']} | 👤 {item['seller_name']} ⭐{item['rating']:.1f}\n\n"
+    return text
+
+def old_listing_text(item, views):
+    return (
+        f"🎯 **{item['skin_name']}**\n\n"
+        f"📦 Качество: **{item['quality']}**\n"
+        f"💰 Цена: **${item['price_usd']}**\n"
+        f"👤 Продавец: **{item['seller_name']}** ⭐{item['rating']:.1f}\n"
+        f"📊 Float: **{item['float_value'] or 'N/A'}**\n"
+        f"🎨 Pattern: **{item['pattern'] or 'N/A'}**\n"
+        f"👀 Просмотров: **{views}**\n"
+        f"🔗 Steam: {item['steam_link']}\n"
+    )
+
+# ---------- Замеры ----------
+
+def make_listings(count):
+    return [
+        {
+            'id': i, 'skin_name': f'AK-47 | Redline #{i}', 'quality': 'Field-Tested',
+            'price_usd': 10 + i, 'price_rub': None, 'seller_name': f'user{i}', 'rating': 4.5,
+            'float_value': 0.15, 'pattern': None, 'views': 10,
+            'steam_link': 'https://steamcommunity.com/market/listings/730/AK-47',
+            'created_at': f'2024-01-31 12:00:{i:02d}',
+        }
+        for i in range(1, count + 1)
+    ]
+
+def measure(func, repeat):
+    """Микросекунд на вызов, лучшее из трёх прогонов"""
+    return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat * 1e6
+
+def main(args):
+    listings = make_listings(PAGE_SIZE)
+    item = listings[0]
+    cases = {
+        'show_listings': (
+            lambda: (old_listings_text(listings, 1), old_listings_keyboard(listings, 1, True)),
+            lambda: (render_listings_page(listings, PAGE_SIZE + 1), get_listings_keyboard(listings, 1, True)),
+        ),
+        'view_listing': (
+            lambda: (old_listing_text(item, 11), old_detail_keyboard(item['id'])),
+            lambda: (render_listing(item, 11), get_listing_detail_keyboard(item['id'])),
+        ),
+        'back_keyboard': (old_back_keyboard, get_back_keyboard),
+        'escape_markdown': (
+            lambda: old_escape_markdown(item['steam_link']),
+            lambda: escape_markdown(item['steam_link']),
+        ),
+    }
+
+    # Результат должен совпадать байт в байт
+    assert old_listings_text(listings, 1) == render_listings_page(listings, PAGE_SIZE + 1)
+    assert old_listing_text(item, 11) == render_listing(item, 11)
+    assert old_listings_keyboard(listings, 1, True) == get_listings_keyboard(listings, 1, True)
+    assert old_detail_keyboard(item['id']) == get_listing_detail_keyboard(item['id'])
+    assert old_escape_markdown(item['steam_link']) == escape_markdown(item['steam_link'])
+
+    for name, (old, new) in cases.items():
+        before = measure(old, args.repeat)
+        after = measure(new, args.repeat)
+        print(f'{name:<16} old {before:8.2f} us   new {after:8.2f} us   saved {before - after:8.2f} us ({before / after:5.1f}x)')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20_000)
+    main(parser.parse_args())
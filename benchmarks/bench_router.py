@@ -0,0 +1,197 @@
+"""Нагрузка на router из handlers.py без сети
+
+Dispatcher получает синтетические апдейты через feed_update, Bot работает
+через StubSession (вызовы API только записываются). Апдейты обрабатываются
+по одному, поэтому задержка и число SQL-запросов относятся к конкретному
+обработчику.
+Запуск: python -m bot.benchmarks.bench_router --updates 5000 --listings 100000
+        python -m bot.benchmarks.bench_router --save baseline.json
+        python -m bot.benchmarks.bench_router --compare baseline.json  (код 1 при регрессии)
+        python -m bot.benchmarks.bench_router --metrics 9100  (с метриками: цена инструментирования)
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from ..database import pool, view_counter, rates
+from ..boot import create_dispatcher
+from ..rates import StaticRateSource
+from .common import temp_db, seed
+from .fake_telegram import StubSession, TOKEN, message_update, callback_update, percentile
+
+# Доли сценариев в потоке апдейтов
+MIX = {
+    'start': 10,
+    'balance': 15,
+    'listings': 25,
+    'view': 30,
+    'buy': 5,
+    'sell': 5,
+    'admin_stats': 10,
+}
+
+# Служебные строки трассировки: управление транзакцией и внутренние запросы FTS
+_NOT_QUERIES = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', '--')
+
+class QueryCounter:
+    """trace callback: считает SQL-запросы приложения.
+    Шаги триггеров SQLite трассирует повтором текста родительского запроса — их пропускаем"""
+
+    def __init__(self):
+        self.count = 0
+        self._last = None
+
+    def __call__(self, sql):
+        if sql.lstrip().upper().startswith(_NOT_QUERIES) or sql == self._last:
+            return
+        self._last = sql
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+def scenario(name, rng, users, listings):
+    """Апдейты одного сценария: (обработчик, функция update_id -> апдейт)"""
+    user_id = rng.randint(1, users)
+    if name == 'start':
+        return [('cmd_start', lambda i: message_update(i, user_id, '/start'))]
+    if name == 'balance':
+        return [('show_balance', lambda i: callback_update(i, user_id, 'balance'))]
+    if name == 'listings':
+        return [('show_listings', lambda i: callback_update(i, user_id, 'listings'))]
+    if name == 'view':
+        listing_id = rng.randint(1, listings)
+        return [('view_listing', lambda i: callback_update(i, user_id, f'view_{listing_id}'))]
+    if name == 'buy':
+        listing_id = rng.randint(1, listings)
+        return [('buy_listing_handler', lambda i: callback_update(i, user_id, f'buy_{listing_id}'))]
+    if name == 'sell':
+        price = str(rng.randint(1, 100))
+        return [
+            ('sell_start', lambda i: callback_update(i, user_id, 'sell')),
+            ('sell_name', lambda i: message_update(i, user_id, 'AK-47 | Redline')),
+            ('sell_quality', lambda i: message_update(i, user_id, 'Field-Tested')),
+            ('sell_price', lambda i: message_update(i, user_id, price)),
+            ('sell_link', lambda i: message_update(i, user_id, 'https://steamcommunity.com/')),
+        ]
+    return [('admin_stats', lambda i: callback_update(i, user_id, 'admin_stats'))]
+
+def make_workload(count, users, listings, seed_value=1):
+    """Последовательность (обработчик, апдейт) длиной не меньше count"""
+    rng = random.Random(seed_value)
+    names, weights = zip(*MIX.items())
+    workload = []
+    while len(workload) < count:
+        for handler, build in scenario(rng.choices(names, weights)[0], rng, users, listings):
+            workload.append((handler, build(len(workload) + 1)))
+    return workload
+
+async def run(dp, bot, workload, queries):
+    """Прогнать апдейты по одному. Возвращает {обработчик: [(секунды, запросов)]} и общее время"""
+    results = defaultdict(list)
+    started = time.perf_counter()
+    for handler, data in workload:
+        update = Update.model_validate(data, context={'bot': bot})
+        before = len(queries)
+        t = time.perf_counter()
+        await dp.feed_update(bot, update)
+        results[handler].append((time.perf_counter() - t, len(queries) - before))
+    return results, time.perf_counter() - started
+
+def summarize(results, elapsed):
+    total = sum(len(samples) for samples in results.values())
+    summary = {'updates': total, 'throughput': total / elapsed, 'handlers': {}}
+    all_queries = 0
+    for handler, samples in sorted(results.items()):
+        latencies = [latency for latency, _ in samples]
+        query_count = sum(count for _, count in samples)
+        all_queries += query_count
+        summary['handlers'][handler] = {
+            'count': len(samples),
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'queries': query_count / len(samples),
+        }
+    summary['queries'] = all_queries / total
+    return summary
+
+def print_summary(summary, calls):
+    print(f'{summary["updates"]} updates   {summary["throughput"]:.1f} updates/s   '
+          f'{summary["queries"]:.2f} queries/update')
+    print(f'{"handler":<20} {"count":>6} {"p50 ms":>9} {"p99 ms":>9} {"queries":>8}')
+    for handler, row in summary['handlers'].items():
+        print(f'{handler:<20} {row["count"]:>6} {row["p50_ms"]:>9.3f} {row["p99_ms"]:>9.3f} {row["queries"]:>8.2f}')
+    print('API calls: ' + ', '.join(f'{name} {count}' for name, count in sorted(calls.items())))
+
+def compare(summary, baseline, tolerance):
+    """Регрессии относительно сохранённого прогона: больше запросов или медленнее p50.
+    p99 на сотне апдейтов — почти максимум и слишком шумный для CI"""
+    problems = []
+    for handler, row in summary['handlers'].items():
+        old = baseline['handlers'].get(handler)
+        if not old:
+            continue
+        # Число запросов детерминировано, допускаем только шум в сотых
+        if row['queries'] > old['queries'] + 0.01:
+            problems.append(f'{handler}: queries {old["queries"]:.2f} -> {row["queries"]:.2f}')
+        if row['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            problems.append(f'{handler}: p50 {old["p50_ms"]:.3f} -> {row["p50_ms"]:.3f} ms')
+    return problems
+
+async def main(args):
+    # Без троттлинга: синтетический пользователь шлёт апдейты быстрее человека,
+    # и число обработанных апдейтов зависело бы от скорости машины
+    dp = create_dispatcher(args.metrics, throttle=False)
+    bot = Bot(token=TOKEN, session=StubSession())
+    # Просмотры сбрасываются только при закрытии, чтобы фоновый flush
+    # не добавлял запросы случайному апдейту
+    view_counter.interval = 3600
+
+    async with temp_db():
+        await seed(users=args.users, listings=args.listings)
+        if args.metrics:
+            # Поднимает сервер /metrics и middleware запросов к Bot API; курс — без сети
+            rates.source = StaticRateSource(90.0)
+            await dp.emit_startup(bot=bot)
+        queries = QueryCounter()
+        await pool.set_trace_callback(queries)
+        workload = make_workload(args.warmup + args.updates, args.users, args.listings)
+        await run(dp, bot, workload[:args.warmup], queries)
+        bot.session.calls.clear()
+        results, elapsed = await run(dp, bot, workload[args.warmup:], queries)
+        await view_counter.close()
+        await pool.set_trace_callback(None)
+        if args.metrics:
+            await dp.emit_shutdown(bot=bot)
+
+    summary = summarize(results, elapsed)
+    print_summary(summary, bot.session.calls)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            problems = compare(summary, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f'REGRESSION {problem}')
+        return not problems
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=500)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--listings', type=int, default=10_000)
+    parser.add_argument('--save', help='сохранить результат в JSON')
+    parser.add_argument('--compare', help='сравнить с сохранённым JSON')
+    parser.add_argument('--metrics', type=int, default=0, help='включить метрики на этом порту')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='допустимый рост p50 (доля)')
+    raise SystemExit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,40 @@
+"""Латентность полнотекстового поиска лотов (FTS5) на большом каталоге
+
+Запуск: python -m bot.benchmarks.bench_search --listings 1000000
+"""
+import argparse
+import asyncio
+import random
+
+from ..database import search_listings
+from .common import temp_db, seed, Timer
+
+WEAPONS = ['AK-47', 'M4A4', 'M4A1-S', 'AWP', 'Desert Eagle', 'USP-S', 'Glock-18', 'P250',
+           'MP9', 'MAC-10', 'FAMAS', 'Galil AR', 'SSG 08', 'Karambit', 'Butterfly Knife']
+FINISHES = ['Redline', 'Asiimov', 'Vulcan', 'Hyper Beast', 'Fade', 'Doppler', 'Neo-Noir',
+            'Printstream', 'Bloodsport', 'Fire Serpent', 'Case Hardened', 'Dragon Lore',
+            'Howl', 'Slate', 'Safari Mesh', 'Boreal Forest', 'Crimson Web', 'Tiger Tooth']
+
+QUERIES = ['redline', 'ak redline', 'awp asiim', 'asiimov', 'redlnie', 'dopler', 'karambit fade', 'howl']
+
+def skin_name(i):
+    return f'{random.choice(WEAPONS)} | {random.choice(FINISHES)}'
+
+async def main(args):
+    async with temp_db():
+        print(f'seeding {args.listings} listings...')
+        await seed(users=args.users, listings=args.listings, names=skin_name)
+
+        for query in QUERIES:
+            with Timer() as t:
+                for _ in range(args.repeat):
+                    rows = await search_listings(query, 20)
+            top = rows[0]['skin_name'] if rows else '-'
+            print(f'{query:<16} {t.elapsed / args.repeat * 1000:8.2f} ms   {len(rows):>3} rows   top: {top}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--listings', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""Задержка обработки апдейтов: webhook против long polling
+
+Бот работает против локального фейкового Bot API; задержка — от отправки
+апдейта до первого ответа бота в этот чат.
+Запуск: python -m bot.benchmarks.bench_webhook --updates 2000 --rate 200
+        python -m bot.benchmarks.bench_webhook --replay updates.jsonl
+"""
+import argparse
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+
+from ..database import rates
+from ..rates import StaticRateSource
+from ..webhook import create_app, create_dispatcher
+from .common import temp_db, seed
+from .fake_telegram import FakeTelegram, make_updates, load_updates, percentile
+
+SECRET = 'bench-secret'
+
+async def paced(updates, rate, send):
+    """Отправлять апдейты с постоянной скоростью rate в секунду"""
+    tasks = []
+    for update in updates:
+        tasks.append(asyncio.create_task(send(update)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+
+async def run_polling(dp, updates, rate):
+    api = FakeTelegram()
+    await api.start()
+    bot = api.bot()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+
+    async def send(update):
+        api.push(update)
+
+    await paced(updates, rate, send)
+    await api.wait_answers(len(updates))
+    await dp.stop_polling()
+    await polling
+    await api.stop()
+    return api.latencies
+
+async def run_webhook(dp, updates, rate):
+    api = FakeTelegram()
+    await api.start()
+    bot = api.bot()
+    runner = web.AppRunner(create_app(bot, dp, path='/webhook', secret_token=SECRET))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    url = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/webhook'
+
+    async with aiohttp.ClientSession() as session:
+        async def send(update):
+            api.expect(update)
+            async with session.post(url, data=json.dumps(update), headers={
+                'Content-Type': 'application/json',
+                'X-Telegram-Bot-Api-Secret-Token': SECRET,
+            }) as response:
+                assert response.status == 200, response.status
+
+        await paced(updates, rate, send)
+        await api.wait_answers(len(updates))
+
+    await runner.cleanup()
+    await api.stop()
+    return api.latencies
+
+def report(name, latencies, total):
+    print(f'{name:<10} answered {len(latencies)}/{total}   '
+          f'p50 {percentile(latencies, 0.5) * 1000:8.2f} ms   p99 {percentile(latencies, 0.99) * 1000:8.2f} ms')
+
+async def main(args):
+    dp = create_dispatcher()
+    # Курс без сети: startup не ждёт внешний сервис, замеры повторяемы
+    rates.source = StaticRateSource(90.0)
+    async with temp_db():
+        await seed(users=1000, listings=1000)
+        # Для webhook — другие пользователи, чтобы /start снова создавал их
+        polling_updates = load_updates(args.replay) if args.replay else make_updates(args.updates)
+        webhook_updates = load_updates(args.replay) if args.replay else make_updates(args.updates, 2_000_000)
+        report('polling', await run_polling(dp, polling_updates, args.rate), len(polling_updates))
+        report('webhook', await run_webhook(dp, webhook_updates, args.rate), len(webhook_updates))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=200, help='апдейтов в секунду')
+    parser.add_argument('--replay', help='JSONL-файл с записанными Update')
+    asyncio.run(main(parser.parse_args()))
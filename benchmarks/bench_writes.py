@@ -0,0 +1,50 @@
+"""Запись при тысячах одновременных писателей: транзакция на запрос против group commit
+
+Запуск: python -m bot.benchmarks.bench_writes --writers 1000 --rounds 5
+"""
+import argparse
+import asyncio
+import random
+
+from ..database import pool, create_user, update_balance, add_listing, buy_listing
+from .common import temp_db, seed, report, Timer
+
+async def writer(user_id, rounds, users, listings):
+    """Один «пользователь»: регистрация, пополнение, выставление лота и покупка"""
+    await create_user(users + user_id, f'new{user_id}', 'New')
+    for _ in range(rounds):
+        await update_balance(user_id, 10)
+        await add_listing(user_id, 'Skin', 'Field-Tested', random.randint(1, 100), '')
+        await buy_listing(random.randint(1, listings), user_id)
+
+async def run(args, max_batch):
+    async with temp_db():
+        await seed(users=args.writers, listings=args.listings)
+        pool.max_batch = max_batch
+        with Timer() as t:
+            await asyncio.gather(*(
+                writer(i, args.rounds, args.writers, args.listings) for i in range(1, args.writers + 1)
+            ))
+        writes = args.writers * (1 + 3 * args.rounds)
+        report(f'max_batch={max_batch}', writes, t.elapsed)
+        print(f'  transactions: {pool.stats["transactions"]}, writes: {pool.stats["writes"]}')
+
+        # Целостность: монеты не появились и не пропали (пополнения учтены отдельно)
+        async with pool.reader() as db:
+            cursor = await db.execute("SELECT value FROM stats WHERE key = 'coins'")
+            stored = (await cursor.fetchone())[0]
+            cursor = await db.execute('SELECT SUM(balance_coins) FROM users')
+            assert stored == (await cursor.fetchone())[0]
+
+async def main(args):
+    for max_batch in (1, args.batch):
+        pool.stats.update(transactions=0, writes=0)
+        await run(args, max_batch)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--listings', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=256, help='max_batch для group commit')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,55 @@
+import os
+import random
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from ..database import pool, init_db
+
+@asynccontextmanager
+async def temp_db():
+    """Временная БД: пул переключается на неё на время бенчмарка"""
+    old_path = pool.path
+    with tempfile.TemporaryDirectory() as tmp:
+        await pool.close()
+        pool.path = os.path.join(tmp, 'bench.db')
+        await init_db()
+        try:
+            yield pool.path
+        finally:
+            await pool.close()
+            pool.path = old_path
+
+async def seed(users=1000, listings=5000, balance=10_000, names=None):
+    """Наполнить БД пользователями и активными лотами"""
+    async with pool.writer() as db:
+        await db.executemany('''
+            INSERT INTO users (user_id, username, full_name, balance_coins)
+            VALUES (?, ?, ?, ?)
+        ''', ((i, f'user{i}', f'User {i}', balance) for i in range(1, users + 1)))
+        # Лоты создаются «раз в минуту» в прошлом, чтобы created_at различались
+        start = datetime.now() - timedelta(minutes=listings)
+        await db.executemany('''
+            INSERT INTO listings (seller_id, skin_name, quality, price_usd, steam_link, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            (
+                random.randint(1, users), names(i) if names else f'Skin {i}', 'Field-Tested',
+                random.randint(1, 100), '',
+                (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+            )
+            for i in range(listings)
+        ))
+
+def report(name, count, elapsed):
+    """Строка отчёта: количество операций в секунду"""
+    print(f'{name:<24} {count:>8} ops  {elapsed:8.3f} s  {count / elapsed:10.1f} ops/s')
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
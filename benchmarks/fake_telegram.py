@@ -0,0 +1,174 @@
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
+from aiogram.client.telegram import TelegramAPIServer
+
+TOKEN = '123456:BENCHMARK-token'
+ME = {'id': 123456, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+def message_result(data):
+    """Ответ Bot API на sendMessage/editMessageText"""
+    return {
+        'message_id': int(data.get('message_id', 1)),
+        'date': int(time.time()),
+        'chat': {'id': int(data.get('chat_id') or 0), 'type': 'private'},
+        'text': data.get('text', ''),
+    }
+
+def chat_of(update):
+    """chat_id, в который бот ответит на апдейт"""
+    if 'message' in update:
+        return update['message']['chat']['id']
+    return update['callback_query']['message']['chat']['id']
+
+class FakeTelegram:
+    """Локальный Bot API: отдаёт апдейты через getUpdates и записывает ответы бота"""
+
+    def __init__(self):
+        self.updates = []
+        self.new_updates = asyncio.Event()
+        self.calls = defaultdict(int)
+        self.latencies = []
+        self._sent_at = defaultdict(deque)
+        self._runner = None
+        self.port = None
+
+    def expect(self, update):
+        """Запомнить момент отправки апдейта: задержка считается до первого ответа в этот чат"""
+        self._sent_at[chat_of(update)].append(time.perf_counter())
+
+    def push(self, update):
+        """Апдейт для long polling"""
+        self.expect(update)
+        self.updates.append(update)
+        self.new_updates.set()
+
+    async def _get_updates(self, data):
+        offset = int(data.get('offset', 0))
+        timeout = float(data.get('timeout', 0))
+        pending = [u for u in self.updates if u['update_id'] >= offset]
+        if not pending and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            pending = [u for u in self.updates if u['update_id'] >= offset]
+        self.updates = pending
+        return pending
+
+    def _answer(self, data):
+        chat_id = int(data['chat_id']) if 'chat_id' in data else None
+        queue = self._sent_at.get(chat_id)
+        if queue:
+            self.latencies.append(time.perf_counter() - queue.popleft())
+        return message_result(data)
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        if request.content_type == 'application/json':
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+
+        if method == 'getMe':
+            result = ME
+        elif method == 'getUpdates':
+            result = await self._get_updates(data)
+        elif method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup'):
+            result = self._answer(data)
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result}, dumps=json.dumps)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    def bot(self):
+        api = TelegramAPIServer.from_base(f'http://127.0.0.1:{self.port}')
+        return Bot(token=TOKEN, session=AiohttpSession(api=api))
+
+    async def wait_answers(self, count, timeout=10):
+        deadline = time.perf_counter() + timeout
+        while len(self.latencies) < count and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+
+class StubSession(BaseSession):
+    """Сессия Bot без сети: записывает вызовы API и отвечает как Telegram.
+    Ответ проходит обычный разбор aiogram (check_response)"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = defaultdict(int)
+
+    async def make_request(self, bot, method, timeout=None):
+        name = method.__api_method__
+        self.calls[name] += 1
+        if name == 'getMe':
+            result = ME
+        elif name in ('sendMessage', 'editMessageText'):
+            result = message_result(method.model_dump())
+        else:
+            result = True
+        return self.check_response(
+            bot=bot, method=method, status_code=200,
+            content=json.dumps({'ok': True, 'result': result}),
+        ).result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+def message_update(update_id, user_id, text):
+    """Апдейт с текстовым сообщением пользователя"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': int(time.time()), 'text': text, 'from': user,
+        'chat': {'id': user_id, 'type': 'private'},
+    }}
+
+def callback_update(update_id, user_id, data):
+    """Апдейт с нажатием inline-кнопки под сообщением бота"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': data,
+        'message': {'message_id': update_id - 1, 'date': int(time.time()), 'text': 'menu',
+                    'chat': {'id': user_id, 'type': 'private'}},
+    }}
+
+def make_updates(count, first_user=1_000_000, existing_users=1000):
+    """Синтетические апдейты: /start нового пользователя и кнопка «Баланс» существующего"""
+    updates = []
+    for i in range(count):
+        if i % 2 == 0:
+            updates.append(message_update(i + 1, first_user + i, '/start'))
+        else:
+            updates.append(callback_update(i + 1, i % existing_users + 1, 'balance'))
+    return updates
+
+def load_updates(path):
+    """Записанные апдейты: по одному JSON-объекту Update на строку"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
@@ -0,0 +1,88 @@
+"""Общий запуск бота для polling и webhook: диспетчер и фоновые службы
+
+Старт параллельный: схема БД (при актуальной user_version — одно чтение
+без транзакции записи), прогрев пула и get_me идут одновременно. Службы
+запускаются без ожидания тяжёлых загрузок: сводки цен строятся в фоне.
+"""
+import asyncio
+import logging
+import time
+
+from aiogram import BaseMiddleware, Dispatcher
+
+from .config import METRICS_PORT, set_bot_username
+from .database import (
+    SHARED, pool, init_db, view_counter, vip_scheduler, rates, analytics, archiver, stats_check_loop
+)
+from .handlers import router
+from .metrics import setup_metrics
+from .notifications import NotificationWorker
+from .storage import SQLiteStorage
+from .throttling import ThrottlingMiddleware
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """Пишет в лог время от запуска процесса до первого обработанного апдейта"""
+
+    def __init__(self, started):
+        self.started = started
+        self.logged = False
+
+    async def __call__(self, handler, event, data):
+        result = await handler(event, data)
+        if not self.logged:
+            self.logged = True
+            logging.info("first update handled %.3f s after start", time.perf_counter() - self.started)
+        return result
+
+class Services:
+    """Фоновые задачи процесса. primary — процесс, которому принадлежат задачи,
+    не допускающие дублей (доставка уведомлений, сверка счётчиков, архив)"""
+
+    def __init__(self, primary=True):
+        self.primary = primary
+        self.notifications = None
+        self._stats_task = None
+
+    async def startup(self, bot):
+        started = time.perf_counter()
+        await asyncio.gather(init_db(), pool.warm_up(), set_bot_username(bot))
+        await rates.start()
+        vip_scheduler.start()
+        analytics.start()
+        if self.primary:
+            self.notifications = NotificationWorker(bot, pool)
+            self.notifications.start()
+            self._stats_task = asyncio.create_task(stats_check_loop())
+            archiver.start()
+        logging.info("startup finished in %.3f s", time.perf_counter() - started)
+
+    async def shutdown(self):
+        if self.notifications is not None:
+            await self.notifications.close()
+            self.notifications = None
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            self._stats_task = None
+        await archiver.close()
+        await vip_scheduler.close()
+        await rates.close()
+        await analytics.close()
+        # Остаток буфера просмотров записывается до закрытия пула
+        await view_counter.close()
+        await pool.close()
+
+def create_dispatcher(metrics_port=METRICS_PORT, throttle=True, primary=True, started=None):
+    """Диспетчер с роутером, middleware и жизненным циклом служб.
+    started — perf_counter() запуска процесса для лога первого апдейта"""
+    # Несколько процессов делят состояния FSM через БД
+    dp = Dispatcher(storage=SQLiteStorage(pool, shared=SHARED))
+    dp.include_router(router)
+    dp.update.outer_middleware(FirstUpdateMiddleware(time.perf_counter() if started is None else started))
+    if throttle:
+        # Флуд отсекается до чтения состояния FSM и обработчиков
+        ThrottlingMiddleware().register(dp)
+    setup_metrics(dp, metrics_port)
+    services = Services(primary)
+    dp.startup.register(services.startup)
+    dp.shutdown.register(services.shutdown)
+    return dp
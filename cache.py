@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class LRUCache:
+    """Ограниченный LRU-кэш с TTL и счётчиками попаданий/промахов.
+    enabled=False — каждый get промах, set ничего не хранит"""
+
+    def __init__(self, maxsize=10_000, ttl=300, enabled=True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        # Растёт при каждой инвалидации: чтение, начатое до неё, не попадёт в кэш
+        self.epoch = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key, _MISSING) if self.enabled else _MISSING
+        if item is _MISSING or item[1] < time.monotonic():
+            if item is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, key, value, epoch=None):
+        """Сохранить значение; если передан epoch и с тех пор была инвалидация — пропустить"""
+        if not self.enabled or (epoch is not None and epoch != self.epoch):
+            return
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, *keys):
+        self.epoch += 1
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self):
+        self.epoch += 1
+        self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
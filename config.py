@@ -1,59 +1,51 @@
+import hashlib
 import os
-import logging
-import asyncio
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.types import Message
-
-# ========== НАСТРОЙКИ ==========
-BOT_TOKEN = os.getenv('BOT_TOKEN')  # Берется из окружения BotHost
-
-if not BOT_TOKEN:
-    raise ValueError("❌ НЕТ ТОКЕНА! Добавьте BOT_TOKEN в переменные окружения")
-
-# ========== ИНИЦИАЛИЗАЦИЯ ==========
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
-logging.basicConfig(level=logging.INFO)
-
-# ========== ПРОСТЕЙШИЕ КОМАНДЫ ==========
-@dp.message(Command("start"))
-async def cmd_start(message: Message):
-    await message.answer(
-        f"👋 Привет, {message.from_user.first_name}!\n\n"
-        f"🔥 Бот SHIZOGP работает!\n"
-        f"🆔 Твой ID: {message.from_user.id}"
-    )
-
-@dp.message(Command("help"))
-async def cmd_help(message: Message):
-    await message.answer(
-        "📋 Доступные команды:\n"
-        "/start - Начать\n"
-        "/help - Помощь\n"
-        "/info - Информация"
-    )
-
-@dp.message(Command("info"))
-async def cmd_info(message: Message):
-    await message.answer(
-        f"🤖 Информация о боте:\n"
-        f"Имя: SHIZOGP\n"
-        f"Версия: 1.0\n"
-        f"Сервер: BotHost"
-    )
-
-@dp.message()
-async def echo_message(message: Message):
-    """Отвечает на любое сообщение"""
-    await message.answer(f"Ты написал: {message.text}")
-
-# ========== ЗАПУСК ==========
-async def main():
-    print("🔥 SHIZOGP БОТ ЗАПУЩЕН!")
-    print(f"🤖 Бот: @{(await bot.get_me()).username}")
-    await dp.start_polling(bot)
-
-if __name__ == "__main__":
-    asyncio.run(main())
+
+
+
+
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+ADMIN_IDS = [int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x]
+WEBSITE_URL = os.getenv('WEBSITE_URL', 'https://shizogp.com')
+VIP_CHAT_LINK = os.getenv('VIP_CHAT_LINK', 'https://t.me/+r3rxYlBjbTYyMDY6')
+VIP_PRICE_COINS = int(os.getenv('VIP_PRICE_COINS', 550))
+VIP_DURATION_DAYS = int(os.getenv('VIP_DURATION_DAYS', 30))
+
+# Бонус пригласившему за нового пользователя; глубина дерева в статистике рефералов
+REFERRAL_BONUS = int(os.getenv('REFERRAL_BONUS', 50))
+REFERRAL_DEPTH = int(os.getenv('REFERRAL_DEPTH', 3))
+
+# Через сколько дней сделки, проданные лоты и доставленные уведомления уходят в архив
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 30))
+
+# Курс USD→RUB: число, путь к файлу или URL (JSON cbr-xml-daily.ru); обновление раз в RATE_REFRESH секунд
+RATE_SOURCE = os.getenv('RATE_SOURCE', 'https://www.cbr-xml-daily.ru/daily_json.js')
+RATE_REFRESH = int(os.getenv('RATE_REFRESH', 3600))
+
+# API для WebApp-магазина ({WEBSITE_URL}/webapp)
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', 8081))
+
+# Метрики Prometheus и профайлер: http://METRICS_HOST:METRICS_PORT/metrics (0 — выключены)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+
+# Webhook: если WEBHOOK_URL не задан, бот работает через long polling
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # публичный https-адрес, например https://bot.shizogp.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', 8080)))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 1))
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _ и -)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or (
+    hashlib.sha256(BOT_TOKEN.encode()).hexdigest() if BOT_TOKEN else None
+)
+
+# Получаем username бота (нужно будет установить после запуска)
+BOT_USERNAME = None
+
+async def set_bot_username(bot):
+    global BOT_USERNAME
+    me = await bot.get_me()
+    BOT_USERNAME = me.username
 
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from collections import Counter
+
+class ViewCounter:
+    """Буфер просмотров лотов: инкременты копятся в памяти
+    и сбрасываются в БД одной транзакцией раз в interval секунд"""
+
+    def __init__(self, pool, interval=5.0):
+        self.pool = pool
+        self.interval = interval
+        self._pending = Counter()
+        self._task = None
+        self._stopped = None
+
+    def hit(self, listing_id):
+        """Учесть просмотр (без обращения к БД)"""
+        self._pending[listing_id] += 1
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def pending(self, listing_id=None):
+        """Просмотры, ещё не записанные в БД: по лоту или всего"""
+        if listing_id is None:
+            return sum(self._pending.values())
+        return self._pending.get(listing_id, 0)
+
+    async def flush(self):
+        """Записать накопленные просмотры одной транзакцией"""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, Counter()
+        try:
+            async with self.pool.writer() as db:
+                await db.executemany(
+                    'UPDATE listings SET views = views + ? WHERE id = ?',
+                    [(count, listing_id) for listing_id, count in batch.items()]
+                )
+        except Exception:
+            # Не теряем просмотры: вернём их в буфер до следующей попытки
+            self._pending.update(batch)
+            raise
+        return len(batch)
+
+    async def _run(self):
+        # Ждём интервал или сигнал остановки; сброс никогда не прерывается на середине
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("views flush failed")
+
+    async def close(self):
+        """Остановить фоновый сброс и записать остаток (при завершении работы)"""
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
+        await self.flush()
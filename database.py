@@ -1,12 +1,72 @@
-import aiosqlite
+import asyncio
+import json
+import logging
 import os
-from datetime import datetime, timedelta
+import re
+from datetime import datetime
+
+from .analytics import PriceAnalytics
+from .archive import Archiver
+from .cache import LRUCache
+from .config import (
+    VIP_DURATION_DAYS, RATE_SOURCE, RATE_REFRESH, REFERRAL_BONUS, REFERRAL_DEPTH, ARCHIVE_AFTER_DAYS,
+    WEBHOOK_WORKERS
+)
+from .counters import ViewCounter
+from .timing import instrumented
+from .pool import ConnectionPool
+from .rates import ExchangeRates, make_source
+from .referrals import ReferralStats
+from .utils import edit_distance
+from .migrations import SCHEMA_VERSION, STATS_AGGREGATES, get_version, migrate, seed_stats
+from .vip import VipScheduler
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'shizogp.db')
 
+# Общий пул соединений, открывается при первом обращении
+pool = ConnectionPool(DB_PATH)
+
+# БД пишут несколько webhook-процессов: запись в одном не сбросит кэши других,
+# поэтому кэши строк выключены (как и кэш SQLiteStorage(shared=True))
+SHARED = WEBHOOK_WORKERS > 1
+
+# Строки users по user_id; каждая запись в users сбрасывает свои ключи после commit
+user_cache = LRUCache(maxsize=10_000, ttl=300, enabled=not SHARED)
+
+# Просмотры лотов пишутся пачками, а не UPDATE на каждый просмотр
+view_counter = ViewCounter(pool, interval=5.0)
+
+# Снимает VIP в момент окончания; запускается вместе с ботом
+vip_scheduler = VipScheduler(pool, cache=user_cache)
+
+# Курс USD→RUB; price_rub лотов пересчитывается при его изменении
+rates = ExchangeRates(pool, make_source(RATE_SOURCE), interval=RATE_REFRESH)
+
+# Медианы и квартили цен по скинам для кнопки «Статистика» и подсказки цены
+analytics = PriceAnalytics(pool)
+
+# Рефералы по уровням дерева; дополняется при регистрации новых
+referral_stats = ReferralStats(pool, depth=REFERRAL_DEPTH, shared=SHARED)
+
+# Перенос холодных строк в *_archive и incremental vacuum в тихие периоды
+archiver = Archiver(pool, after_days=ARCHIVE_AFTER_DAYS)
+
+# Продление VIP: от текущего окончания, если VIP ещё действует, иначе от now.
+# Параметры: now, now, дней, user_id
+VIP_EXTEND_SQL = '''
+    UPDATE users SET vip_status = 1,
+        vip_until = datetime(MAX(COALESCE(vip_until, ?), ?), '+' || ? || ' days')
+    WHERE user_id = ?
+'''
+
 async def init_db():
     """Инициализация всех таблиц"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    # Схема последней версии (user_version в заголовке файла): ни CREATE, ни транзакции записи
+    async with pool.reader() as db:
+        if await get_version(db) == SCHEMA_VERSION:
+            return
+    
+    async with pool.writer() as db:
         # Таблица пользователей
         await db.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -101,19 +161,79 @@ async def init_db():
                 FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
         ''')
-        
-        await db.commit()
+    
+        # Архив холодных строк (archive.py): те же колонки, без внешних ключей.
+        # Создаётся до миграций: счётчик сделок в stats учитывает и архив
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS listings_archive (
+                id INTEGER PRIMARY KEY,
+                seller_id INTEGER,
+                skin_name TEXT,
+                quality TEXT,
+                price_usd REAL,
+                price_rub INTEGER,
+                steam_link TEXT,
+                image_url TEXT,
+                float_value REAL,
+                pattern TEXT,
+                status TEXT,
+                views INTEGER,
+                created_at DATETIME
+            )
+        ''')
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS transactions_archive (
+                id INTEGER PRIMARY KEY,
+                listing_id INTEGER,
+                buyer_id INTEGER,
+                seller_id INTEGER,
+                amount_usd REAL,
+                status TEXT,
+                created_at DATETIME,
+                completed_at DATETIME,
+                buyer_rating INTEGER,
+                seller_rating INTEGER
+            )
+        ''')
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS notifications_archive (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                type TEXT,
+                title TEXT,
+                message TEXT,
+                data TEXT,
+                is_read INTEGER,
+                created_at DATETIME
+            )
+        ''')
+    
+    # Индексы и изменения схемы поверх базовых таблиц
+    await migrate(pool)
 
+@instrumented
 async def get_user(user_id):
-    """Получить данные пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    """Получить данные пользователя (через кэш)"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    epoch = user_cache.epoch
+    async with pool.reader() as db:
         cursor = await db.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        return await cursor.fetchone()
+        user = await cursor.fetchone()
+    if user is not None:
+        user_cache.set(user_id, user, epoch)
+    return user
 
+@instrumented
 async def create_user(user_id, username, full_name, referrer_id=None):
     """Создать нового пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    # Известный пользователь — без захвата блокировки записи
+    if user_cache.get(user_id) is not None:
+        return
+    
+    async with pool.writer() as db:
         # Проверяем существование
         cursor = await db.execute('SELECT user_id FROM users WHERE user_id = ?', (user_id,))
         if await cursor.fetchone():
@@ -125,111 +245,353 @@ async def create_user(user_id, username, full_name, referrer_id=None):
             VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
         ''', (user_id, username, full_name, 100, referrer_id))
         
-        # Начисляем бонус за реферала
+        # Начисляем бонус за реферала (если пригласивший существует) и пишем его в журнал
+        ancestors = []
         if referrer_id:
-            await db.execute('''
-                UPDATE users SET balance_coins = balance_coins + 50 WHERE user_id = ?
-            ''', (referrer_id,))
-        
-        await db.commit()
-        return True
+            cursor = await db.execute('''
+                UPDATE users SET balance_coins = balance_coins + ? WHERE user_id = ?
+                RETURNING user_id
+            ''', (REFERRAL_BONUS, referrer_id))
+            paid = await cursor.fetchone()
+            await cursor.close()
+            if paid:
+                await db.execute('''
+                    INSERT INTO referral_ledger (user_id, referral_id, amount, reason)
+                    VALUES (?, ?, ?, 'signup')
+                ''', (referrer_id, user_id, REFERRAL_BONUS))
+                ancestors = await referral_stats.ancestors(db, referrer_id)
+    
+    user_cache.invalidate(user_id, referrer_id)
+    referral_stats.added(ancestors)
+    return True
 
+@instrumented
 async def update_balance(user_id, amount):
     """Изменить баланс пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute('''
             UPDATE users SET balance_coins = balance_coins + ? WHERE user_id = ?
         ''', (amount, user_id))
-        await db.commit()
+    user_cache.invalidate(user_id)
 
+@instrumented
 async def add_listing(seller_id, skin_name, quality, price_usd, steam_link):
     """Добавить объявление о продаже"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute('''
-            INSERT INTO listings (seller_id, skin_name, quality, price_usd, steam_link)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (seller_id, skin_name, quality, price_usd, steam_link))
-        await db.commit()
-        return cursor.lastrowid
-
-async def get_active_listings(limit=10):
-    """Получить активные объявления"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.writer() as db:
         cursor = await db.execute('''
+            INSERT INTO listings (seller_id, skin_name, quality, price_usd, price_rub, steam_link)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (seller_id, skin_name, quality, price_usd, rates.to_rub(price_usd), steam_link))
+    analytics.add_ask(skin_name, quality, price_usd)
+    return cursor.lastrowid
+
+@instrumented
+async def get_active_listings(limit=10, after=None, before=None):
+    """Получить активные объявления (новые сверху).
+    after/before — ключ (created_at, id) лота, после/до которого нужна страница"""
+    if before:
+        keyset, order, params = 'AND (l.created_at, l.id) > (?, ?)', 'ASC', (*before, limit)
+    elif after:
+        keyset, order, params = 'AND (l.created_at, l.id) < (?, ?)', 'DESC', (*after, limit)
+    else:
+        keyset, order, params = '', 'DESC', (limit,)
+    
+    async with pool.reader() as db:
+        cursor = await db.execute(f'''
             SELECT l.*, u.username as seller_name, u.rating 
             FROM listings l
             JOIN users u ON l.seller_id = u.user_id
-            WHERE l.status = 'active'
-            ORDER BY l.created_at DESC
+            WHERE l.status = 'active' {keyset}
+            ORDER BY l.created_at {order}, l.id {order}
             LIMIT ?
-        ''', (limit,))
-        return await cursor.fetchall()
+        ''', params)
+        rows = await cursor.fetchall()
+    
+    # Страница «назад» читается по возрастанию, показываем как обычно
+    return rows[::-1] if before else rows
 
-async def buy_listing(listing_id, buyer_id):
-    """Купить скин (создать сделку)"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Получаем информацию о лоте
+@instrumented
+async def get_listing(listing_id):
+    """Лот с именем и рейтингом продавца (давно проданные — из архива)"""
+    async with pool.reader() as db:
         cursor = await db.execute('''
-            SELECT seller_id, price_usd FROM listings 
-            WHERE id = ? AND status = 'active'
+            SELECT l.*, u.username as seller_name, u.rating 
+            FROM listings l
+            JOIN users u ON l.seller_id = u.user_id
+            WHERE l.id = ?
         ''', (listing_id,))
-        listing = await cursor.fetchone()
-        
-        if not listing:
-            return False, "Лот не найден"
-        
-        seller_id, price = listing
-        
-        # Проверяем баланс покупателя
-        cursor = await db.execute('SELECT balance_coins FROM users WHERE user_id = ?', (buyer_id,))
-        buyer = await cursor.fetchone()
-        
-        if not buyer or buyer[0] < price:
-            return False, "Недостаточно средств"
-        
-        # Создаём транзакцию
-        await db.execute('''
-            INSERT INTO transactions (listing_id, buyer_id, seller_id, amount_usd, status)
-            VALUES (?, ?, ?, ?, 'pending')
-        ''', (listing_id, buyer_id, seller_id, price))
-        
-        # Обновляем статус лота
-        await db.execute('UPDATE listings SET status = \'sold\' WHERE id = ?', (listing_id,))
-        
-        # Списание денег у покупателя и зачисление продавцу
-        await db.execute('UPDATE users SET balance_coins = balance_coins - ? WHERE user_id = ?', (price, buyer_id))
-        await db.execute('UPDATE users SET balance_coins = balance_coins + ? WHERE user_id = ?', (price, seller_id))
+        row = await cursor.fetchone()
+        if row is None:
+            cursor = await db.execute('''
+                SELECT l.*, u.username as seller_name, u.rating
+                FROM listings_archive l
+                JOIN users u ON l.seller_id = u.user_id
+                WHERE l.id = ?
+            ''', (listing_id,))
+            row = await cursor.fetchone()
+        return row
+
+def _fts_query(terms):
+    """FTS5-запрос: все слова обязательны, последнее — как префикс (ввод ещё идёт)"""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+async def _correct_terms(db, terms):
+    """Заменить слова, которых нет в индексе, на ближайшие по словарю FTS (опечатки)"""
+    corrected = []
+    for term in terms:
+        if len(term) < 3:
+            corrected.append(term)
+            continue
+        cursor = await db.execute(
+            'SELECT term, doc FROM listings_fts_vocab WHERE term >= ? AND term < ?',
+            (term[0], chr(ord(term[0]) + 1))
+        )
+        vocabulary = await cursor.fetchall()
+        if any(word.startswith(term) for word, _ in vocabulary):
+            corrected.append(term)
+            continue
+        limit = 1 if len(term) <= 5 else 2
+        best = min(
+            ((edit_distance(term, word, limit), -doc, word) for word, doc in vocabulary),
+            default=None
+        )
+        corrected.append(best[2] if best and best[0] <= limit else term)
+    return corrected
+
+@instrumented
+async def search_listings(text, limit=20, offset=0):
+    """Поиск активных лотов по названию и качеству, от дешёвых к дорогим.
+    Совпадения по введённым словам идут раньше исправленных опечаток"""
+    terms = re.findall(r'[^\W_]+', text.lower())
+    if not terms:
+        return []
+    
+    async with pool.reader() as db:
+        # Младшие 32 бита rowid в listings_fts — id лота (см. миграцию 3)
+        sql = '''
+            SELECT l.*, u.username as seller_name, u.rating
+            FROM (
+                SELECT rowid & 4294967295 AS id FROM listings_fts
+                WHERE listings_fts MATCH ?
+                ORDER BY rowid
+                LIMIT ? OFFSET ?
+            ) AS f
+            JOIN listings l ON l.id = f.id
+            JOIN users u ON l.seller_id = u.user_id
+            ORDER BY l.price_usd, l.id
+        '''
+        cursor = await db.execute(sql, (_fts_query(terms), limit, offset))
+        rows = await cursor.fetchall()
         
-        await db.commit()
-        return True, "Покупка успешна"
+        if not rows and offset == 0:
+            corrected = await _correct_terms(db, terms)
+            if corrected != terms:
+                cursor = await db.execute(sql, (_fts_query(corrected), limit, offset))
+                rows = await cursor.fetchall()
+    return rows
 
+async def notify(db, user_id, type, title, message, data=None):
+    """Поставить уведомление в очередь (в транзакции вызывающего)"""
+    await db.execute('''
+        INSERT INTO notifications (user_id, type, title, message, data)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (user_id, type, title, message, json.dumps(data) if data is not None else None))
+
+class PurchaseError(Exception):
+    """Покупка невозможна, транзакция откатывается"""
+
+@instrumented
+async def buy_listing(listing_id, buyer_id):
+    """Купить скин (создать сделку) одной короткой транзакцией"""
+    try:
+        async with pool.writer() as db:
+            # Лот снимается с продажи, только если он ещё активен
+            cursor = await db.execute('''
+                UPDATE listings SET status = 'sold'
+                WHERE id = ? AND status = 'active'
+                RETURNING seller_id, price_usd, skin_name, quality
+            ''', (listing_id,))
+            listing = await cursor.fetchone()
+            await cursor.close()
+            
+            if not listing:
+                raise PurchaseError("Лот не найден")
+            
+            seller_id, price, skin_name, quality = listing
+            
+            # Списание только при достаточном балансе
+            cursor = await db.execute('''
+                UPDATE users SET balance_coins = balance_coins - ?, total_purchases = total_purchases + 1
+                WHERE user_id = ? AND balance_coins >= ?
+            ''', (price, buyer_id, price))
+            if cursor.rowcount != 1:
+                raise PurchaseError("Недостаточно средств")
+            
+            await db.execute('''
+                UPDATE users SET balance_coins = balance_coins + ?, total_sales = total_sales + 1
+                WHERE user_id = ?
+            ''', (price, seller_id))
+            
+            # Создаём транзакцию
+            await db.execute('''
+                INSERT INTO transactions (listing_id, buyer_id, seller_id, amount_usd, status)
+                VALUES (?, ?, ?, ?, 'pending')
+            ''', (listing_id, buyer_id, seller_id, price))
+            
+            await notify(
+                db, seller_id, 'sale', "💰 Скин продан!",
+                f"{skin_name} (лот #{listing_id}) куплен за ${price}.",
+                {'listing_id': listing_id, 'buyer_id': buyer_id}
+            )
+    except PurchaseError as e:
+        return False, str(e)
+    
+    user_cache.invalidate(buyer_id, seller_id)
+    analytics.record_sale(skin_name, quality, price)
+    return True, "Покупка успешна"
+
+@instrumented
 async def add_review(from_user_id, to_user_id, transaction_id, rating, comment):
     """Добавить отзыв"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute('''
             INSERT INTO reviews (from_user_id, to_user_id, transaction_id, rating, comment)
             VALUES (?, ?, ?, ?, ?)
         ''', (from_user_id, to_user_id, transaction_id, rating, comment))
         
-        # Обновляем рейтинг пользователя
-        cursor = await db.execute('SELECT AVG(rating) FROM reviews WHERE to_user_id = ?', (to_user_id,))
-        avg_rating = (await cursor.fetchone())[0]
-        
-        cursor = await db.execute('SELECT COUNT(*) FROM reviews WHERE to_user_id = ?', (to_user_id,))
-        count = (await cursor.fetchone())[0]
-        
+        # Обновляем средний рейтинг по текущему среднему и числу отзывов, без пересчёта всех отзывов
         await db.execute('''
-            UPDATE users SET rating = ?, rating_count = ? WHERE user_id = ?
-        ''', (avg_rating, count, to_user_id))
+            UPDATE users
+            SET rating = (rating * rating_count + ?) / (rating_count + 1),
+                rating_count = rating_count + 1
+            WHERE user_id = ?
+        ''', (rating, to_user_id))
         
-        await db.commit()
+        await notify(
+            db, to_user_id, 'review', "⭐ Новый отзыв",
+            f"Оценка: {rating}/5" + (f"\n{comment}" if comment else ""),
+            {'from_user_id': from_user_id, 'transaction_id': transaction_id}
+        )
+    user_cache.invalidate(to_user_id)
 
-async def activate_vip(user_id):
-    """Активировать VIP статус"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        vip_until = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+@instrumented
+async def rebuild_ratings():
+    """Пересчитать рейтинги всех пользователей по таблице отзывов за один проход"""
+    async with pool.writer() as db:
+        cursor = await db.execute('''
+            UPDATE users
+            SET rating = r.total * 1.0 / r.count, rating_count = r.count
+            FROM (
+                SELECT to_user_id, SUM(rating) AS total, COUNT(*) AS count
+                FROM reviews GROUP BY to_user_id
+            ) AS r
+            WHERE users.user_id = r.to_user_id
+        ''')
+        updated = cursor.rowcount
+        
+        # Пользователи без отзывов возвращаются к значениям по умолчанию
         await db.execute('''
-            UPDATE users SET vip_status = 1, vip_until = ? WHERE user_id = ?
-        ''', (vip_until, user_id))
-        await db.commit()
\ No newline at end of file
+            UPDATE users SET rating = 5.0, rating_count = 0
+            WHERE rating_count != 0
+              AND user_id NOT IN (SELECT to_user_id FROM reviews WHERE to_user_id IS NOT NULL)
+        ''')
+    
+    user_cache.clear()
+    return updated
+
+@instrumented
+async def activate_vip(user_id, days=VIP_DURATION_DAYS):
+    """Активировать или продлить VIP статус. Возвращает новую дату окончания"""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            VIP_EXTEND_SQL + ' RETURNING vip_until', (now, now, days, user_id)
+        )
+        row = await cursor.fetchone()
+    user_cache.invalidate(user_id)
+    if row is None:
+        return None
+    vip_scheduler.schedule(user_id, row[0])
+    return row[0]
+
+# ========== МАССОВЫЕ ОПЕРАЦИИ ==========
+# Строк на транзакцию: писатель не занят надолго, остальные запросы проходят между пачками
+BULK_CHUNK = 5000
+
+async def _bulk_update(sql, rows, progress=None, chunk=BULK_CHUNK):
+    """executemany пачками по chunk строк, каждая пачка — своя транзакция.
+    rows — список кортежей, последним элементом идёт user_id.
+    progress(done, total) вызывается после каждой пачки. Возвращает число изменённых строк"""
+    updated = 0
+    for start in range(0, len(rows), chunk):
+        batch = rows[start:start + chunk]
+        async with pool.writer() as db:
+            cursor = await db.executemany(sql, batch)
+            updated += cursor.rowcount
+        user_cache.invalidate(*(row[-1] for row in batch))
+        if progress is not None:
+            await progress(start + len(batch), len(rows))
+    return updated
+
+@instrumented
+async def bulk_update_balance(items, progress=None):
+    """Начислить монеты многим пользователям: items — [(user_id, сумма)]"""
+    return await _bulk_update(
+        'UPDATE users SET balance_coins = balance_coins + ? WHERE user_id = ?',
+        [(amount, user_id) for user_id, amount in items],
+        progress
+    )
+
+@instrumented
+async def bulk_activate_vip(items, progress=None):
+    """Выдать VIP многим пользователям: items — [(user_id, дней)].
+    Действующий VIP продлевается от текущей даты окончания"""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    updated = await _bulk_update(
+        VIP_EXTEND_SQL, [(now, now, days, user_id) for user_id, days in items], progress
+    )
+    vip_scheduler.refresh()
+    return updated
+
+@instrumented
+async def get_stats():
+    """Счётчики для админской статистики (таблица stats, без агрегатов)"""
+    async with pool.reader() as db:
+        cursor = await db.execute('SELECT key, value FROM stats')
+        return {key: value for key, value in await cursor.fetchall()}
+
+async def check_stats(fix=True):
+    """Сверить stats с настоящими агрегатами. Возвращает расхождения {key: (было, стало)}"""
+    # Сверка идёт на читателе в одном снимке (WAL), писатель не блокируется
+    async with pool.reader() as db:
+        await db.execute('BEGIN')
+        try:
+            cursor = await db.execute('SELECT key, value FROM stats')
+            stored = {key: value for key, value in await cursor.fetchall()}
+            mismatches = {}
+            for key, sql in STATS_AGGREGATES.items():
+                cursor = await db.execute(sql)
+                actual = (await cursor.fetchone())[0]
+                if stored.get(key) != actual:
+                    mismatches[key] = (stored.get(key), actual)
+        finally:
+            await db.execute('ROLLBACK')
+    
+    if mismatches and fix:
+        async with pool.writer() as db:
+            await seed_stats(db)
+    
+    if mismatches:
+        logging.warning("stats mismatch%s: %s", " (fixed)" if fix else "", mismatches)
+    return mismatches
+
+async def stats_check_loop(interval=3600):
+    """Периодическая сверка счётчиков в фоне"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await check_stats()
+        except Exception:
+            logging.exception("stats check failed")
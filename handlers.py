@@ -1,12 +1,18 @@
 from aiogram import F, Router
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import (
+    Message, CallbackQuery, FSInputFile,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 import json
+import time
 
+from .config import VIP_PRICE_COINS, VIP_DURATION_DAYS, REFERRAL_BONUS
 from .database import *
 from .keyboards import *
+from .rendering import render_listings_page, render_listing, render_price_stats, render_suggestion, rub
 from .utils import *
 
 router = Router()
@@ -22,6 +28,10 @@ class ReviewStates(StatesGroup):
     waiting_for_rating = State()
     waiting_for_comment = State()
 
+class AdminStates(StatesGroup):
+    waiting_for_balance_batch = State()
+    waiting_for_vip_batch = State()
+
 # ========== КОМАНДА СТАРТ ==========
 @router.message(Command("start"))
 async def cmd_start(message: Message, state: FSMContext):
@@ -82,7 +92,7 @@ async def show_balance(callback: CallbackQuery):
     if user['vip_status']:
         text += f"👑 VIP до **{user['vip_until'][:10]}**"
     else:
-        text += f"👑 VIP стоит 550 монет (30 дней)"
+        text += f"👑 VIP стоит {VIP_PRICE_COINS} монет ({VIP_DURATION_DAYS} дней)"
     
     await callback.message.edit_text(text, reply_markup=get_back_keyboard(), parse_mode="Markdown")
 
@@ -94,15 +104,19 @@ async def show_referral(callback: CallbackQuery):
     
     ref_link = f"https://t.me/{BOT_USERNAME}?start=ref_{user_id}"
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM users WHERE referrer_id = ?", (user_id,))
-        count = await cursor.fetchone()
-        referrals = count[0] if count else 0
+    # Счётчики из строки пользователя (кэш) и уровни дерева из кэша referral_stats
+    user = await get_user(user_id)
+    levels = await referral_stats.levels(user_id)
+    referrals = user['referral_count'] if user else 0
+    earned = user['referral_earnings'] if user else 0
+    tree = " | ".join(f"{level}: {count}" for level, count in enumerate(levels, 1))
     
     text = (
         f"🤝 **РЕФЕРАЛЬНАЯ ПРОГРАММА**\n\n"
         f"👥 Твои рефералы: **{referrals}**\n"
-        f"💰 Бонус за друга: **50 монет**\n\n"
+        f"🌳 По уровням: {tree}\n"
+        f"💸 Заработано: **{earned} монет**\n"
+        f"💰 Бонус за друга: **{REFERRAL_BONUS} монет**\n\n"
         f"🔗 Твоя ссылка:\n`{ref_link}`\n\n"
         f"📤 Отправь её друзьям и получай бонусы!"
     )
@@ -133,9 +147,13 @@ async def sell_name(message: Message, state: FSMContext):
 async def sell_quality(message: Message, state: FSMContext):
     await state.update_data(quality=message.text)
     await state.set_state(SellStates.waiting_for_price)
+    data = await state.get_data()
+    suggestion = analytics.suggested_price(data['skin_name'], message.text)
     await message.answer(
+        render_suggestion(suggestion) +
         "💰 Шаг 3/4: Введи цену в USD\n"
-        "Только число, например: `1500`"
+        "Только число, например: `1500`",
+        parse_mode="Markdown"
     )
 
 @router.message(SellStates.waiting_for_price)
@@ -179,9 +197,17 @@ async def sell_link(message: Message, state: FSMContext):
     await state.clear()
 
 # ========== ПРОСМОТР СКИНОВ ==========
-@router.callback_query(F.data == "listings")
-async def show_listings(callback: CallbackQuery):
-    listings = await get_active_listings(5)
+PAGE_SIZE = 5
+
+async def render_listings(callback: CallbackQuery, page=0, after=None, before=None):
+    # Лишняя запись показывает, есть ли следующая страница
+    listings = await get_active_listings(PAGE_SIZE + 1, after=after, before=before)
+    if before:
+        has_next = True
+        listings = listings[-PAGE_SIZE:]
+    else:
+        has_next = len(listings) > PAGE_SIZE
+        listings = listings[:PAGE_SIZE]
     
     if not listings:
         await callback.message.edit_text(
@@ -191,14 +217,43 @@ async def show_listings(callback: CallbackQuery):
         )
         return
     
-    text = "**📋 ДОСТУПНЫЕ СКИНЫ**\n\n"
-    for i, item in enumerate(listings, 1):
-        text += f"{i}. **{item['skin_name']}** ({item['quality']})\n"
-        text += f"   💰 ${item['price_usd']} | 👤 {item['seller_name']} ⭐{item['rating']:.1f}\n\n"
-    
     await callback.message.edit_text(
-        text,
-        reply_markup=get_listings_keyboard(listings),
+        render_listings_page(listings, page * PAGE_SIZE + 1),
+        reply_markup=get_listings_keyboard(listings, page, has_next),
+        parse_mode="Markdown"
+    )
+
+@router.callback_query(F.data == "listings")
+async def show_listings(callback: CallbackQuery):
+    await render_listings(callback)
+
+@router.callback_query(F.data.startswith("page_"))
+async def show_listings_page(callback: CallbackQuery):
+    # page_<номер>_<p|n>_<курсор>
+    try:
+        _, page, direction, cursor = callback.data.split("_", 3)
+        page = int(page)
+        key = decode_cursor(cursor)
+    except ValueError:
+        # Кнопка из старого сообщения (page_<номер>) — показываем первую страницу
+        await render_listings(callback)
+        return
+    if direction == "p" and page > 0:
+        await render_listings(callback, page, before=key)
+    elif direction == "p":
+        await render_listings(callback)
+    else:
+        await render_listings(callback, page, after=key)
+
+# ========== СТАТИСТИКА ЦЕН ==========
+STATS_TOP = 10
+
+@router.callback_query(F.data == "stats")
+async def show_price_stats(callback: CallbackQuery):
+    # Сводки уже в памяти analytics: запросов к БД здесь нет
+    await callback.message.edit_text(
+        render_price_stats(analytics.top(STATS_TOP)),
+        reply_markup=get_stats_keyboard(),
         parse_mode="Markdown"
     )
 
@@ -207,37 +262,48 @@ async def show_listings(callback: CallbackQuery):
 async def view_listing(callback: CallbackQuery):
     listing_id = int(callback.data.split("_")[1])
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute('''
-            SELECT l.*, u.username as seller_name, u.rating 
-            FROM listings l
-            JOIN users u ON l.seller_id = u.user_id
-            WHERE l.id = ?
-        ''', (listing_id,))
-        item = await cursor.fetchone()
+    item = await get_listing(listing_id)
     
     if not item:
         await callback.message.edit_text("❌ Скин не найден", reply_markup=get_back_keyboard())
         return
     
-    text = (
-        f"🎯 **{item['skin_name']}**\n\n"
-        f"📦 Качество: **{item['quality']}**\n"
-        f"💰 Цена: **${item['price_usd']}**\n"
-        f"👤 Продавец: **{item['seller_name']}** ⭐{item['rating']:.1f}\n"
-        f"📊 Float: **{item['float_value'] or 'N/A'}**\n"
-        f"🎨 Pattern: **{item['pattern'] or 'N/A'}**\n"
-        f"👀 Просмотров: **{item['views']}**\n"
-        f"🔗 Steam: {item['steam_link']}\n"
-    )
+    view_counter.hit(listing_id)
+    views = item['views'] + view_counter.pending(listing_id)
     
     await callback.message.edit_text(
-        text,
+        render_listing(item, views),
         reply_markup=get_listing_detail_keyboard(listing_id),
         parse_mode="Markdown"
     )
 
+# ========== ПОИСК (INLINE-РЕЖИМ) ==========
+INLINE_PAGE_SIZE = 20
+
+@router.inline_query()
+async def inline_search(query: InlineQuery):
+    offset = int(query.offset or 0)
+    listings = await search_listings(query.query, INLINE_PAGE_SIZE, offset)
+    
+    results = [
+        InlineQueryResultArticle(
+            id=str(item['id']),
+            title=f"{item['skin_name']} ({item['quality']})",
+            description=f"💰 ${item['price_usd']}{rub(item['price_rub'])} | 👤 {item['seller_name']} ⭐{item['rating']:.1f}",
+            input_message_content=InputTextMessageContent(
+                message_text=(
+                    f"🎯 {item['skin_name']} ({item['quality']})\n"
+                    f"💰 ${item['price_usd']} | 👤 {item['seller_name']}\n"
+                    f"🆔 Лот #{item['id']}"
+                )
+            )
+        )
+        for item in listings
+    ]
+    
+    next_offset = str(offset + INLINE_PAGE_SIZE) if len(listings) == INLINE_PAGE_SIZE else ""
+    await query.answer(results, cache_time=5, next_offset=next_offset)
+
 # ========== ПОКУПКА ==========
 @router.callback_query(F.data.startswith("buy_"))
 async def buy_listing_handler(callback: CallbackQuery):
@@ -259,18 +325,16 @@ async def buy_listing_handler(callback: CallbackQuery):
         )
 
 # ========== АДМИН ПАНЕЛЬ ==========
+async def is_admin(user_id):
+    user = await get_user(user_id)
+    return bool(user and user['is_admin'])
+
 @router.message(Command("admin"))
 async def admin_panel(message: Message):
-    user_id = message.from_user.id
-    
     # Проверяем админа
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT is_admin FROM users WHERE user_id = ?", (user_id,))
-        user = await cursor.fetchone()
-        
-        if not user or not user[0]:
-            await message.answer("⛔ У тебя нет прав администратора.")
-            return
+    if not await is_admin(message.from_user.id):
+        await message.answer("⛔ У тебя нет прав администратора.")
+        return
     
     await message.answer(
         "🔧 **ПАНЕЛЬ АДМИНИСТРАТОРА**\n\nВыбери действие:",
@@ -280,21 +344,12 @@ async def admin_panel(message: Message):
 
 @router.callback_query(F.data == "admin_stats")
 async def admin_stats(callback: CallbackQuery):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM users")
-        users_count = (await cursor.fetchone())[0]
-        
-        cursor = await db.execute("SELECT COUNT(*) FROM listings WHERE status = 'active'")
-        listings_count = (await cursor.fetchone())[0]
-        
-        cursor = await db.execute("SELECT COUNT(*) FROM transactions")
-        transactions_count = (await cursor.fetchone())[0]
-        
-        cursor = await db.execute("SELECT COUNT(*) FROM users WHERE vip_status = 1")
-        vip_count = (await cursor.fetchone())[0]
-        
-        cursor = await db.execute("SELECT SUM(balance_coins) FROM users")
-        total_coins = (await cursor.fetchone())[0] or 0
+    stats = await get_stats()
+    users_count = stats.get('users', 0)
+    vip_count = stats.get('vip', 0)
+    listings_count = stats.get('active_listings', 0)
+    transactions_count = stats.get('transactions', 0)
+    total_coins = stats.get('coins', 0)
     
     text = (
         f"📊 **СТАТИСТИКА**\n\n"
@@ -307,6 +362,96 @@ async def admin_stats(callback: CallbackQuery):
     
     await callback.message.edit_text(text, reply_markup=get_admin_keyboard(), parse_mode="Markdown")
 
+# ========== МАССОВЫЕ НАЧИСЛЕНИЯ ==========
+# Лимит Bot API на скачивание файла ботом
+MAX_BATCH_FILE = 20 * 1024 * 1024
+
+@router.callback_query(F.data == "admin_add_balance")
+async def admin_add_balance(callback: CallbackQuery, state: FSMContext):
+    if not await is_admin(callback.from_user.id):
+        await callback.answer("⛔ Нет прав", show_alert=True)
+        return
+    await state.set_state(AdminStates.waiting_for_balance_batch)
+    await callback.message.edit_text(
+        "💰 **ПОПОЛНЕНИЕ БАЛАНСА**\n\n"
+        "Отправь CSV-файл или текст, по строке на пользователя:\n"
+        "`user_id,сумма`\n\n"
+        "Отрицательная сумма списывает монеты.",
+        reply_markup=get_back_keyboard(),
+        parse_mode="Markdown"
+    )
+
+@router.callback_query(F.data == "admin_give_vip")
+async def admin_give_vip(callback: CallbackQuery, state: FSMContext):
+    if not await is_admin(callback.from_user.id):
+        await callback.answer("⛔ Нет прав", show_alert=True)
+        return
+    await state.set_state(AdminStates.waiting_for_vip_batch)
+    await callback.message.edit_text(
+        "👑 **ВЫДАЧА VIP**\n\n"
+        "Отправь CSV-файл или текст, по строке на пользователя:\n"
+        "`user_id,дней`\n\n"
+        "Действующий VIP продлевается.",
+        reply_markup=get_back_keyboard(),
+        parse_mode="Markdown"
+    )
+
+async def read_batch(message: Message):
+    """Текст сообщения или содержимое приложенного файла"""
+    if message.document:
+        if (message.document.file_size or 0) > MAX_BATCH_FILE:
+            return None
+        data = await message.bot.download(message.document)
+        return data.read().decode('utf-8-sig', errors='replace')
+    return message.text or ""
+
+async def run_batch(message: Message, state: FSMContext, apply, valid):
+    """Разобрать список, применить его пачками и показывать прогресс"""
+    await state.clear()
+    if not await is_admin(message.from_user.id):
+        return
+    
+    text = await read_batch(message)
+    if text is None:
+        await message.answer("❌ Файл больше 20 МБ", reply_markup=get_admin_keyboard())
+        return
+    items, errors = parse_id_value_csv(text, valid)
+    if not items:
+        await message.answer("❌ Не найдено ни одной строки `user_id,число`", parse_mode="Markdown")
+        return
+    
+    status = await message.answer(f"⏳ Обработано 0 из {len(items)}")
+    last_edit = time.monotonic()
+    
+    async def progress(done, total):
+        # Не чаще раза в секунду: лимит Telegram на редактирование
+        nonlocal last_edit
+        if done == total or time.monotonic() - last_edit < 1:
+            return
+        last_edit = time.monotonic()
+        await status.edit_text(f"⏳ Обработано {done} из {total}")
+    
+    started = time.monotonic()
+    updated = await apply(items, progress)
+    
+    text = (
+        f"✅ Готово за {time.monotonic() - started:.1f} с\n\n"
+        f"👥 Обновлено: {updated} из {len(items)}\n"
+        f"❓ Не найдено пользователей: {len(items) - updated}"
+    )
+    if errors:
+        shown = ", ".join(map(str, errors[:10])) + (" …" if len(errors) > 10 else "")
+        text += f"\n⚠️ Пропущено строк: {len(errors)} ({shown})"
+    await status.edit_text(text, reply_markup=get_admin_keyboard())
+
+@router.message(AdminStates.waiting_for_balance_batch)
+async def admin_balance_batch(message: Message, state: FSMContext):
+    await run_batch(message, state, bulk_update_balance, lambda amount: amount != 0)
+
+@router.message(AdminStates.waiting_for_vip_batch)
+async def admin_vip_batch(message: Message, state: FSMContext):
+    await run_batch(message, state, bulk_activate_vip, lambda days: days > 0)
+
 # ========== ВОЗВРАТ В ГЛАВНОЕ МЕНЮ ==========
 @router.callback_query(F.data == "main_menu")
 async def back_to_main(callback: CallbackQuery):
@@ -1,6 +1,15 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from .utils import encode_cursor
+
+# Клавиатуры неизменяемы (frozen-модели aiogram), поэтому одинаковые
+# создаются один раз и переиспользуются во всех ответах
+BACK_BUTTON = InlineKeyboardButton(text="◀ Назад", callback_data="main_menu")
+STATS_BUTTON = InlineKeyboardButton(text="📊", callback_data="stats")
+
+@lru_cache(maxsize=None)
 def get_main_keyboard(website_url: str, vip_chat_link: str):
     """Главное меню"""
     buttons = [
@@ -20,44 +29,58 @@ def get_main_keyboard(website_url: str, vip_chat_link: str):
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@lru_cache(maxsize=None)
 def get_back_keyboard():
     """Кнопка назад"""
+    return InlineKeyboardMarkup(inline_keyboard=[[BACK_BUTTON]])
+
+@lru_cache(maxsize=None)
+def get_stats_keyboard():
+    """Из статистики цен обратно к лотам"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="◀ Назад", callback_data="main_menu")]
+        [InlineKeyboardButton(text="◀ К лотам", callback_data="listings")]
     ])
 
-def get_listings_keyboard(listings, page=0):
-    """Клавиатура со списком скинов"""
-    builder = InlineKeyboardBuilder()
-    
-    for listing in listings:
-        builder.row(InlineKeyboardButton(
-            text=f"{listing['skin_name']} - ${listing['price_usd']}",
-            callback_data=f"view_{listing['id']}"
-        ))
+@lru_cache(maxsize=4096)
+def _listing_button(listing_id, skin_name, price_usd):
+    return InlineKeyboardButton(text=f"{skin_name} - ${price_usd}", callback_data=f"view_{listing_id}")
+
+def get_listings_keyboard(listings, page=0, has_next=True):
+    """Клавиатура со списком скинов.
+    Навигация по ключу первого/последнего лота: page_<номер>_<p|n>_<курсор>"""
+    rows = [
+        [_listing_button(listing['id'], listing['skin_name'], listing['price_usd'])]
+        for listing in listings
+    ]
     
     # Навигация
     nav_buttons = []
     if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="◀", callback_data=f"page_{page-1}"))
-    nav_buttons.append(InlineKeyboardButton(text="📊", callback_data="stats"))
-    nav_buttons.append(InlineKeyboardButton(text="▶", callback_data=f"page_{page+1}"))
-    
-    builder.row(*nav_buttons)
-    builder.row(InlineKeyboardButton(text="◀ Назад", callback_data="main_menu"))
+        nav_buttons.append(InlineKeyboardButton(
+            text="◀", callback_data=f"page_{page-1}_p_{encode_cursor(listings[0])}"
+        ))
+    nav_buttons.append(STATS_BUTTON)
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton(
+            text="▶", callback_data=f"page_{page+1}_n_{encode_cursor(listings[-1])}"
+        ))
     
-    return builder.as_markup()
+    rows.append(nav_buttons)
+    rows.append([BACK_BUTTON])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
+@lru_cache(maxsize=4096)
 def get_listing_detail_keyboard(listing_id):
     """Клавиатура для детального просмотра"""
-    builder = InlineKeyboardBuilder()
-    builder.row(
-        InlineKeyboardButton(text="💰 Купить", callback_data=f"buy_{listing_id}"),
-        InlineKeyboardButton(text="📞 Спросить", callback_data=f"ask_{listing_id}")
-    )
-    builder.row(InlineKeyboardButton(text="◀ Назад к списку", callback_data="listings"))
-    return builder.as_markup()
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="💰 Купить", callback_data=f"buy_{listing_id}"),
+            InlineKeyboardButton(text="📞 Спросить", callback_data=f"ask_{listing_id}")
+        ],
+        [InlineKeyboardButton(text="◀ Назад к списку", callback_data="listings")]
+    ])
 
+@lru_cache(maxsize=None)
 def get_admin_keyboard():
     """Админская клавиатура"""
     buttons = [
@@ -66,6 +89,6 @@ def get_admin_keyboard():
         [InlineKeyboardButton(text="💰 Пополнить баланс", callback_data="admin_add_balance")],
         [InlineKeyboardButton(text="👑 Выдать VIP", callback_data="admin_give_vip")],
         [InlineKeyboardButton(text="📦 Сделки", callback_data="admin_transactions")],
-        [InlineKeyboardButton(text="◀ Назад", callback_data="main_menu")]
+        [BACK_BUTTON]
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
\ No newline at end of file
@@ -1,20 +1,36 @@
-import os
+"""Точка входа: long polling, а если задан WEBHOOK_URL — webhook
 
+Запуск: python -m bot.main
+"""
+import time
 
+# До тяжёлых импортов: от этой отметки считается время до первого апдейта
+STARTED = time.perf_counter()
 
+import asyncio
+import logging
 
-BOT_TOKEN = os.getenv('BOT_TOKEN')
-ADMIN_IDS = [int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x]
-WEBSITE_URL = os.getenv('WEBSITE_URL', 'https://shizogp.com')
-VIP_CHAT_LINK = os.getenv('VIP_CHAT_LINK', 'https://t.me/+r3rxYlBjbTYyMDY6')
-VIP_PRICE_COINS = int(os.getenv('VIP_PRICE_COINS', 550))
-VIP_DURATION_DAYS = int(os.getenv('VIP_DURATION_DAYS', 30))
+from .config import BOT_TOKEN, WEBHOOK_URL
 
-# Получаем username бота (нужно будет установить после запуска)
-BOT_USERNAME = None
+async def polling():
+    # aiogram и обработчики импортируются только здесь: в webhook-режиме их грузят воркеры
+    from aiogram import Bot
+    from .boot import create_dispatcher
+    logging.info("imports done in %.3f s", time.perf_counter() - STARTED)
 
-async def set_bot_username(bot):
-    global BOT_USERNAME
-    me = await bot.get_me()
-    BOT_USERNAME = me.username
+    bot = Bot(token=BOT_TOKEN)
+    dp = create_dispatcher(started=STARTED)
+    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
+def main():
+    logging.basicConfig(level=logging.INFO)
+    if not BOT_TOKEN:
+        raise ValueError("❌ НЕТ ТОКЕНА! Добавьте BOT_TOKEN в переменные окружения")
+    if WEBHOOK_URL:
+        from .webhook import main as run_webhook
+        run_webhook()
+        return
+    asyncio.run(polling())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Разовые служебные команды
+
+Запуск: python -m bot.maintenance <команда>
+"""
+import argparse
+import asyncio
+
+import aiosqlite
+
+from .database import pool, init_db, rebuild_ratings, check_stats
+
+async def cmd_rebuild_ratings():
+    updated = await rebuild_ratings()
+    print(f'ratings rebuilt for {updated} users')
+
+async def cmd_check_stats():
+    mismatches = await check_stats()
+    print(f'stats fixed: {mismatches}' if mismatches else 'stats OK')
+
+async def cmd_vacuum():
+    """Перевести файл на auto_vacuum = INCREMENTAL полным VACUUM (бот должен быть остановлен).
+    Дальше свободные страницы возвращает архиватор, без полного VACUUM"""
+    await pool.close()
+    # VACUUM не выполняется внутри транзакции, а пул пишет только в транзакциях
+    async with aiosqlite.connect(pool.path, isolation_level=None) as db:
+        await db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        await db.execute('VACUUM')
+    print('vacuum done, auto_vacuum = incremental')
+
+COMMANDS = {
+    'rebuild-ratings': cmd_rebuild_ratings,
+    'check-stats': cmd_check_stats,
+    'vacuum': cmd_vacuum,
+}
+
+async def main(command):
+    await init_db()
+    try:
+        await COMMANDS[command]()
+    finally:
+        await pool.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('command', choices=COMMANDS)
+    asyncio.run(main(parser.parse_args().command))
@@ -0,0 +1,151 @@
+"""Метрики в формате Prometheus и сэмплирующий профайлер
+
+Включаются, только если задан METRICS_PORT: тогда setup_metrics() вешает
+middleware на обработчики и запросы к Bot API, а локальный aiohttp-сервер
+отдаёт /metrics и /profile?seconds=N (свёрнутые стеки для flamegraph).
+Без METRICS_PORT middleware не регистрируются, а instrumented() сводится
+к одной проверке флага. Middleware — обычные вызываемые объекты, а
+aiohttp.web загружается при старте сервера: сам модуль не импортирует
+ни aiogram, ни aiohttp.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+
+from . import timing
+from .config import METRICS_HOST, METRICS_PORT
+from .timing import HISTOGRAMS, handler_seconds, telegram_seconds
+
+class HandlerLatencyMiddleware:
+    """Время каждого обработчика из handlers.py (inner middleware)"""
+
+    async def __call__(self, handler, event, data):
+        name = data['handler'].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_seconds.observe(name, time.perf_counter() - started)
+
+class TelegramLatencyMiddleware:
+    """Время запросов к Bot API по методам"""
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            telegram_seconds.observe(method.__api_method__, time.perf_counter() - started)
+
+def _gauges():
+    """Счётчики, которые и так ведут пул, кэш и буферы: читаются только при сборе"""
+    from .database import pool, user_cache, view_counter, archiver
+    return [
+        ('bot_db_transactions_total', 'counter', pool.stats['transactions']),
+        ('bot_db_writes_total', 'counter', pool.stats['writes']),
+        ('bot_db_write_requests_total', 'counter', pool.stats['requests']),
+        ('bot_db_busy_retries_total', 'counter', pool.stats['busy_retries']),
+        ('bot_db_lock_wait_seconds_total', 'counter', pool.stats['lock_wait']),
+        ('bot_user_cache_hits_total', 'counter', user_cache.hits),
+        ('bot_user_cache_misses_total', 'counter', user_cache.misses),
+        ('bot_view_counter_pending', 'gauge', view_counter.pending()),
+        ('bot_archived_rows_total', 'counter', archiver.stats['archived']),
+        ('bot_vacuumed_pages_total', 'counter', archiver.stats['vacuumed_pages']),
+    ]
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for name, kind, value in _gauges():
+        lines += [f'# TYPE {name} {kind}', f'{name} {value}']
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    return '\n'.join(lines) + '\n'
+
+# ========== ПРОФАЙЛЕР ==========
+class SamplingProfiler:
+    """Раз в interval секунд снимает стек главного потока (там работает event loop).
+    Результат — свёрнутые стеки: "f1;f2;f3 <число сэмплов>" на строку"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lock = threading.Lock()
+
+    def _sample(self, thread_id, seconds):
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f'{frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        return stacks
+
+    async def profile(self, seconds):
+        """Профилировать текущий поток seconds секунд; одновременно — только один прогон"""
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            stacks = await asyncio.to_thread(self._sample, threading.get_ident(), seconds)
+        finally:
+            self.lock.release()
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+profiler = SamplingProfiler()
+
+# ========== HTTP ==========
+# aiohttp.web импортируется только при включённых метриках
+async def metrics_view(request):
+    from aiohttp import web
+    return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+async def profile_view(request):
+    from aiohttp import web
+    try:
+        seconds = min(float(request.query.get('seconds', 10)), 60)
+    except ValueError:
+        raise web.HTTPBadRequest(text='seconds must be a number')
+    result = await profiler.profile(seconds)
+    if result is None:
+        raise web.HTTPConflict(text='profiler is already running')
+    return web.Response(text=result, content_type='text/plain', charset='utf-8')
+
+async def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Локальный сервер метрик. Возвращает AppRunner для остановки"""
+    from aiohttp import web
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_view)
+    app.router.add_get('/profile', profile_view)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def setup_metrics(dp, port=METRICS_PORT, host=METRICS_HOST):
+    """Включить метрики для диспетчера, если задан порт"""
+    if not port:
+        return
+    timing.enabled = True
+    middleware = HandlerLatencyMiddleware()
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(middleware)
+
+    runner = None
+
+    async def on_startup(bot):
+        nonlocal runner
+        bot.session.middleware(TelegramLatencyMiddleware())
+        runner = await start_server(host, port)
+
+    async def on_shutdown():
+        if runner is not None:
+            await runner.cleanup()
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
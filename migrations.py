@@ -0,0 +1,312 @@
+"""Версионные миграции схемы на основе PRAGMA user_version
+
+Каждая миграция выполняется в своей короткой транзакции писателя,
+поэтому читатели (WAL) продолжают работать во время обновления.
+Проверка планов: python -m bot.migrations
+"""
+import asyncio
+
+from . import archive
+
+# Цена в ключе listings_fts занимает 31 бит: rowid остаётся положительным int64.
+# Лоты от $21 474 836.47 идут в поиске последними, между собой — по id
+FTS_MAX_CENTS = 0x7FFFFFFF
+
+def _fts_rowid(row):
+    """Ключ строки в listings_fts: цена в центах в старших битах, id лота — в младших"""
+    cents = f'CAST(ROUND(COALESCE({row}.price_usd, 0) * 100) AS INTEGER)'
+    return f'((MAX(MIN({cents}, {FTS_MAX_CENTS}), 0) << 32) | {row}.id)'
+
+# Заполнение индекса и триггеры, которые держат в нём только активные лоты
+FTS_BACKFILL = f'''INSERT INTO listings_fts (rowid, skin_name, quality)
+   SELECT {_fts_rowid('listings')}, skin_name, quality FROM listings WHERE status = 'active' '''
+FTS_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS listings_fts_insert AFTER INSERT ON listings
+       WHEN NEW.status = 'active' BEGIN
+           INSERT INTO listings_fts (rowid, skin_name, quality)
+           VALUES ({_fts_rowid('NEW')}, NEW.skin_name, NEW.quality);
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS listings_fts_delete AFTER DELETE ON listings
+       WHEN OLD.status = 'active' BEGIN
+           INSERT INTO listings_fts (listings_fts, rowid, skin_name, quality)
+           VALUES ('delete', {_fts_rowid('OLD')}, OLD.skin_name, OLD.quality);
+       END''',
+    # Удаление старой версии и вставка новой — в одном триггере, строго по порядку
+    f'''CREATE TRIGGER IF NOT EXISTS listings_fts_update
+       AFTER UPDATE OF skin_name, quality, price_usd, status ON listings BEGIN
+           INSERT INTO listings_fts (listings_fts, rowid, skin_name, quality)
+           SELECT 'delete', {_fts_rowid('OLD')}, OLD.skin_name, OLD.quality WHERE OLD.status = 'active';
+           INSERT INTO listings_fts (rowid, skin_name, quality)
+           SELECT {_fts_rowid('NEW')}, NEW.skin_name, NEW.quality WHERE NEW.status = 'active';
+       END''',
+]
+
+# (версия, шаги). Шаг — SQL-строка или async-функция от соединения,
+# например lambda db: add_column(db, ...). Новые миграции — только в конец
+MIGRATIONS = [
+    (1, [
+        # Активные лоты: частичный индекс под WHERE status = 'active' ORDER BY created_at
+        '''CREATE INDEX IF NOT EXISTS idx_listings_active
+           ON listings (created_at DESC, id DESC) WHERE status = 'active' ''',
+        'CREATE INDEX IF NOT EXISTS idx_users_referrer ON users (referrer_id)',
+        'CREATE INDEX IF NOT EXISTS idx_reviews_to_user ON reviews (to_user_id, rating)',
+        '''CREATE INDEX IF NOT EXISTS idx_notifications_unread
+           ON notifications (user_id, created_at) WHERE is_read = 0''',
+    ]),
+    (2, [
+        # Счётчики для админской статистики, поддерживаются триггерами
+        'CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID',
+        lambda db: seed_stats(db),
+        '''CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users BEGIN
+               UPDATE stats SET value = value + 1 WHERE key = 'users';
+               UPDATE stats SET value = value + (NEW.vip_status = 1) WHERE key = 'vip';
+               UPDATE stats SET value = value + COALESCE(NEW.balance_coins, 0) WHERE key = 'coins';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS stats_users_delete AFTER DELETE ON users BEGIN
+               UPDATE stats SET value = value - 1 WHERE key = 'users';
+               UPDATE stats SET value = value - (OLD.vip_status = 1) WHERE key = 'vip';
+               UPDATE stats SET value = value - COALESCE(OLD.balance_coins, 0) WHERE key = 'coins';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS stats_users_balance AFTER UPDATE OF balance_coins ON users BEGIN
+               UPDATE stats SET value = value + COALESCE(NEW.balance_coins, 0) - COALESCE(OLD.balance_coins, 0)
+               WHERE key = 'coins';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS stats_users_vip AFTER UPDATE OF vip_status ON users BEGIN
+               UPDATE stats SET value = value + (NEW.vip_status = 1) - (OLD.vip_status = 1) WHERE key = 'vip';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS stats_listings_insert AFTER INSERT ON listings BEGIN
+               UPDATE stats SET value = value + (NEW.status = 'active') WHERE key = 'active_listings';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS stats_listings_delete AFTER DELETE ON listings BEGIN
+               UPDATE stats SET value = value - (OLD.status = 'active') WHERE key = 'active_listings';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS stats_listings_status AFTER UPDATE OF status ON listings BEGIN
+               UPDATE stats SET value = value + (NEW.status = 'active') - (OLD.status = 'active')
+               WHERE key = 'active_listings';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS stats_transactions_insert AFTER INSERT ON transactions BEGIN
+               UPDATE stats SET value = value + 1 WHERE key = 'transactions';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS stats_transactions_delete AFTER DELETE ON transactions BEGIN
+               UPDATE stats SET value = value - 1 WHERE key = 'transactions';
+           END''',
+    ]),
+    (3, [
+        # Полнотекстовый поиск только по активным лотам. Индекс без хранения текста
+        # (content=''), rowid = (цена в центах << 32) | id: совпадения идут сразу
+        # в порядке цены, и ORDER BY rowid LIMIT не сортирует все найденные строки
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+               skin_name, quality, content='', prefix='2 3'
+           )''',
+        'CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts_vocab USING fts5vocab(listings_fts, row)',
+        FTS_BACKFILL,
+        *FTS_TRIGGERS,
+    ]),
+    (4, [
+        # Очередь доставки уведомлений: только неотправленные, по порядку id
+        'CREATE INDEX IF NOT EXISTS idx_notifications_pending ON notifications (id) WHERE is_read = 0',
+    ]),
+    (5, [
+        # Состояния FSM (продажа, отзыв) переживают рестарт и общие для всех процессов
+        '''CREATE TABLE IF NOT EXISTS fsm_states (
+               key TEXT PRIMARY KEY,
+               state TEXT,
+               data TEXT NOT NULL DEFAULT '{}',
+               updated_at REAL NOT NULL
+           ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)',
+    ]),
+    (6, [
+        # Ближайшие окончания VIP для планировщика снятия
+        'CREATE INDEX IF NOT EXISTS idx_users_vip_until ON users (vip_until) WHERE vip_status = 1',
+    ]),
+    (7, [
+        # Последний курс валют: после рестарта цены в рублях считаются без сети
+        '''CREATE TABLE IF NOT EXISTS exchange_rates (
+               pair TEXT PRIMARY KEY,
+               rate REAL NOT NULL,
+               updated_at REAL NOT NULL
+           ) WITHOUT ROWID''',
+    ]),
+    (8, [
+        # Рефералы: счётчик и заработок в строке пригласившего, журнал начислений
+        lambda db: add_column(db, 'users', 'referral_count', 'INTEGER NOT NULL DEFAULT 0'),
+        lambda db: add_column(db, 'users', 'referral_earnings', 'INTEGER NOT NULL DEFAULT 0'),
+        '''CREATE TABLE IF NOT EXISTS referral_ledger (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER NOT NULL,
+               referral_id INTEGER,
+               amount INTEGER NOT NULL,
+               reason TEXT NOT NULL,
+               created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+           )''',
+        'CREATE INDEX IF NOT EXISTS idx_referral_ledger_user ON referral_ledger (user_id, id)',
+        # Прошлые бонусы за регистрацию были фиксированными 50 монет
+        '''INSERT INTO referral_ledger (user_id, referral_id, amount, reason, created_at)
+           SELECT r.referrer_id, r.user_id, 50, 'signup', r.registration_date
+           FROM users r JOIN users u ON u.user_id = r.referrer_id''',
+        '''UPDATE users SET
+               referral_count = (SELECT COUNT(*) FROM users r WHERE r.referrer_id = users.user_id),
+               referral_earnings = (
+                   SELECT COALESCE(SUM(amount), 0) FROM referral_ledger WHERE user_id = users.user_id
+               )
+           WHERE user_id IN (SELECT referrer_id FROM users)''',
+        '''CREATE TRIGGER IF NOT EXISTS users_referral_count AFTER INSERT ON users
+           WHEN NEW.referrer_id IS NOT NULL BEGIN
+               UPDATE users SET referral_count = referral_count + 1 WHERE user_id = NEW.referrer_id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS referral_ledger_insert AFTER INSERT ON referral_ledger BEGIN
+               UPDATE users SET referral_earnings = referral_earnings + NEW.amount WHERE user_id = NEW.user_id;
+           END''',
+    ]),
+    (9, [
+        # Выбор холодных строк для архива (archive.COLD) и проверка «у лота нет горячей сделки»
+        'CREATE INDEX IF NOT EXISTS idx_transactions_created ON transactions (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_listing ON transactions (listing_id)',
+        "CREATE INDEX IF NOT EXISTS idx_listings_inactive ON listings (created_at) WHERE status != 'active'",
+        'CREATE INDEX IF NOT EXISTS idx_notifications_read ON notifications (created_at) WHERE is_read != 0',
+        # Перенос сделки в архив не уменьшает счётчик: он считает обе таблицы
+        'DROP TRIGGER IF EXISTS stats_transactions_delete',
+        '''CREATE TRIGGER IF NOT EXISTS stats_transactions_delete AFTER DELETE ON transactions
+           WHEN NOT EXISTS (SELECT 1 FROM transactions_archive WHERE id = OLD.id) BEGIN
+               UPDATE stats SET value = value - 1 WHERE key = 'transactions';
+           END''',
+    ]),
+    (10, [
+        # Ключ listings_fts с ценой, ограниченной FTS_MAX_CENTS: прежний (цена << 32)
+        # переполнял int64 от $21 474 836.48, и такие лоты в поиске шли первыми
+        'DROP TRIGGER IF EXISTS listings_fts_insert',
+        'DROP TRIGGER IF EXISTS listings_fts_delete',
+        'DROP TRIGGER IF EXISTS listings_fts_update',
+        "INSERT INTO listings_fts (listings_fts) VALUES ('delete-all')",
+        FTS_BACKFILL,
+        *FTS_TRIGGERS,
+    ]),
+]
+
+# Точные агрегаты для счётчиков таблицы stats
+STATS_AGGREGATES = {
+    'users': 'SELECT COUNT(*) FROM users',
+    'vip': 'SELECT COUNT(*) FROM users WHERE vip_status = 1',
+    'coins': 'SELECT COALESCE(SUM(balance_coins), 0) FROM users',
+    'active_listings': "SELECT COUNT(*) FROM listings WHERE status = 'active'",
+    'transactions': 'SELECT (SELECT COUNT(*) FROM transactions) + (SELECT COUNT(*) FROM transactions_archive)',
+}
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Горячие запросы из database.py и handlers.py, которые обязаны идти по индексу
+HOT_QUERIES = {
+    'get_user': ('SELECT * FROM users WHERE user_id = ?', (1,)),
+    'get_active_listings': ('''
+        SELECT l.*, u.username as seller_name, u.rating
+        FROM listings l
+        JOIN users u ON l.seller_id = u.user_id
+        WHERE l.status = 'active'
+        ORDER BY l.created_at DESC, l.id DESC
+        LIMIT ?
+    ''', (10,)),
+    'get_active_listings_page': ('''
+        SELECT l.*, u.username as seller_name, u.rating
+        FROM listings l
+        JOIN users u ON l.seller_id = u.user_id
+        WHERE l.status = 'active' AND (l.created_at, l.id) < (?, ?)
+        ORDER BY l.created_at DESC, l.id DESC
+        LIMIT ?
+    ''', ('2024-01-01 00:00:00', 1, 10)),
+    'view_listing': ('''
+        SELECT l.*, u.username as seller_name, u.rating
+        FROM listings l
+        JOIN users u ON l.seller_id = u.user_id
+        WHERE l.id = ?
+    ''', (1,)),
+    # Шаг обхода дерева рефералов (referrals.TREE_SQL)
+    'referral_children': ('SELECT user_id FROM users WHERE referrer_id = ?', (1,)),
+    'referral_ledger': (
+        'SELECT * FROM referral_ledger WHERE user_id = ? ORDER BY id DESC LIMIT ?', (1, 10)
+    ),
+    'pending_notifications': (
+        'SELECT id, user_id, title, message FROM notifications WHERE is_read = 0 ORDER BY id LIMIT ?', (100,)
+    ),
+    'vip_expiry': ('''
+        SELECT vip_until, user_id FROM users
+        WHERE vip_status = 1 AND vip_until IS NOT NULL
+        ORDER BY vip_until
+        LIMIT ?
+    ''', (10000,)),
+    'archive_transactions': (archive.COLD['transactions'], ('-30 days', 1000)),
+    'archive_listings': (archive.COLD['listings'], ('-30 days', 1000)),
+    'archive_notifications': (archive.COLD['notifications'], ('-30 days', 1000)),
+    'unread_notifications': (
+        'SELECT * FROM notifications WHERE user_id = ? AND is_read = 0 ORDER BY created_at', (1,)
+    ),
+}
+
+async def get_version(db):
+    cursor = await db.execute('PRAGMA user_version')
+    return (await cursor.fetchone())[0]
+
+async def add_column(db, table, column, definition):
+    """ALTER TABLE ADD COLUMN, если колонки ещё нет (мгновенно, без перезаписи таблицы)"""
+    cursor = await db.execute(f'PRAGMA table_info({table})')
+    if column not in {row[1] for row in await cursor.fetchall()}:
+        await db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+async def seed_stats(db):
+    """Заполнить stats точными значениями (полный проход по таблицам)"""
+    for key, sql in STATS_AGGREGATES.items():
+        await db.execute(
+            f'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ({sql}))', (key,)
+        )
+
+async def migrate(pool):
+    """Применить все миграции новее текущей user_version. Возвращает итоговую версию"""
+    async with pool.reader() as db:
+        version = await get_version(db)
+
+    for target, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        async with pool.writer() as db:
+            # Другой процесс мог успеть раньше
+            if await get_version(db) >= target:
+                continue
+            for sql in statements:
+                if callable(sql):
+                    await sql(db)
+                else:
+                    await db.execute(sql)
+            await db.execute(f'PRAGMA user_version = {target}')
+        version = target
+
+    return version
+
+async def explain(db, sql, params=()):
+    """Строки EXPLAIN QUERY PLAN"""
+    cursor = await db.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+    return [row[3] for row in await cursor.fetchall()]
+
+async def check_query_plans(pool):
+    """Вернуть горячие запросы, которые делают полный проход по таблице"""
+    full_scans = {}
+    async with pool.reader() as db:
+        for name, (sql, params) in HOT_QUERIES.items():
+            plan = await explain(db, sql, params)
+            scans = [step for step in plan if step.startswith('SCAN') and 'INDEX' not in step]
+            if scans:
+                full_scans[name] = scans
+    return full_scans
+
+async def _main():
+    from .database import pool, init_db
+    await init_db()
+    async with pool.reader() as db:
+        print(f'schema version: {await get_version(db)} (latest {SCHEMA_VERSION})')
+    full_scans = await check_query_plans(pool)
+    for name, scans in full_scans.items():
+        print(f'FULL SCAN {name}: {"; ".join(scans)}')
+    await pool.close()
+    return not full_scans
+
+if __name__ == '__main__':
+    raise SystemExit(0 if asyncio.run(_main()) else 1)
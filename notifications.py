@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import time
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest, TelegramRetryAfter
+
+# Лимиты Telegram: ~30 сообщений в секунду всего и ~1 в секунду в один чат
+GLOBAL_RATE = 30
+PER_CHAT_RATE = 1
+MAX_ATTEMPTS = 3
+
+# Значения notifications.is_read
+UNREAD, DELIVERED, UNDELIVERABLE = 0, 1, -1
+
+class TokenBucket:
+    """Token bucket: не больше rate операций в секунду, всплеск до capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        # Пауза после RetryAfter от Telegram
+        self.paused_until = 0.0
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Взять токен без ожидания; False, если лимит исчерпан"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class NotificationWorker:
+    """Фоновая доставка непрочитанных уведомлений пачками с учётом лимитов Telegram"""
+
+    def __init__(self, bot, pool, batch_size=100, idle_interval=1.0):
+        self.bot = bot
+        self.pool = pool
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.bucket = TokenBucket(GLOBAL_RATE)
+        self._last_sent = {}
+        self._task = None
+        self._stopped = None
+
+    async def fetch_batch(self):
+        async with self.pool.reader() as db:
+            cursor = await db.execute('''
+                SELECT id, user_id, title, message FROM notifications
+                WHERE is_read = 0
+                ORDER BY id
+                LIMIT ?
+            ''', (self.batch_size,))
+            return await cursor.fetchall()
+
+    async def mark(self, ids, status):
+        """Пометить уведомления одним UPDATE"""
+        if not ids:
+            return
+        async with self.pool.writer() as db:
+            await db.execute(
+                'UPDATE notifications SET is_read = ? WHERE id IN (SELECT value FROM json_each(?))',
+                (status, json.dumps(ids))
+            )
+
+    async def _send(self, row):
+        text = f"{row['title']}\n\n{row['message']}" if row['title'] else row['message']
+        for _ in range(MAX_ATTEMPTS):
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(row['user_id'], text)
+                return DELIVERED
+            except TelegramRetryAfter as e:
+                # Telegram просит подождать — притормаживаем всю отправку
+                self.bucket.pause(e.retry_after)
+            except (TelegramForbiddenError, TelegramBadRequest):
+                # Бот заблокирован или чат не найден — повторять бессмысленно
+                return UNDELIVERABLE
+            except Exception:
+                # Сетевые ошибки: уведомление останется в очереди до следующей пачки
+                logging.exception("notification %s not sent", row['id'])
+                return UNREAD
+        return UNREAD
+
+    async def _send_chat(self, rows):
+        """Сообщения одного чата — последовательно, не чаще PER_CHAT_RATE в секунду"""
+        results = []
+        for row in rows:
+            wait = self._last_sent.get(row['user_id'], 0) + 1 / PER_CHAT_RATE - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            results.append((row['id'], await self._send(row)))
+            self._last_sent[row['user_id']] = time.monotonic()
+        return results
+
+    async def deliver_batch(self):
+        """Отправить одну пачку. Возвращает количество обработанных уведомлений"""
+        rows = await self.fetch_batch()
+        if not rows:
+            return 0
+
+        chats = {}
+        for row in rows:
+            chats.setdefault(row['user_id'], []).append(row)
+        results = await asyncio.gather(*(self._send_chat(chat_rows) for chat_rows in chats.values()))
+
+        statuses = {DELIVERED: [], UNDELIVERABLE: [], UNREAD: []}
+        for chat_results in results:
+            for notification_id, status in chat_results:
+                statuses[status].append(notification_id)
+        await self.mark(statuses[DELIVERED], DELIVERED)
+        await self.mark(statuses[UNDELIVERABLE], UNDELIVERABLE)
+
+        # Старые отметки о последней отправке больше не ограничивают чат
+        threshold = time.monotonic() - 1 / PER_CHAT_RATE
+        self._last_sent = {chat: at for chat, at in self._last_sent.items() if at > threshold}
+        return len(rows) - len(statuses[UNREAD])
+
+    async def _run(self):
+        while not self._stopped.is_set():
+            try:
+                delivered = await self.deliver_batch()
+            except Exception:
+                logging.exception("notifications delivery failed")
+                delivered = 0
+            if not delivered:
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), self.idle_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Дождаться текущей пачки и остановиться"""
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
@@ -0,0 +1,263 @@
+import asyncio
+import random
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+# Прагмы, которые применяются один раз при открытии соединения
+PRAGMAS = (
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA mmap_size = 134217728',
+)
+
+# Повторы BEGIN IMMEDIATE, если БД заблокирована другим процессом
+BUSY_RETRIES = 6
+BUSY_BACKOFF = 0.01
+
+# Сколько запросов на запись объединять в одну транзакцию (group commit)
+MAX_BATCH = 256
+
+def is_busy(error):
+    """Ошибка блокировки SQLite (SQLITE_BUSY / SQLITE_LOCKED)"""
+    message = str(error)
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+class _WriteRequest:
+    """Запрос на запись в очереди писателя"""
+    __slots__ = ('granted', 'finished', 'committed')
+
+    def __init__(self, loop):
+        # Писатель -> вызывающий: соединение выдано (транзакция или savepoint открыты)
+        self.granted = loop.create_future()
+        # Вызывающий -> писатель: тело with завершилось (True) или упало (False)
+        self.finished = loop.create_future()
+        # Писатель -> вызывающий: общая транзакция закоммичена
+        self.committed = loop.create_future()
+
+def _resolve(future, error=None):
+    if not future.done():
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+class ConnectionPool:
+    """Пул долгоживущих соединений: несколько читателей и один писатель.
+    Записи проходят через очередь единственной задачи-писателя: подряд идущие
+    запросы выполняются в одной транзакции (каждый в своём savepoint) и
+    подтверждаются одним commit"""
+
+    def __init__(self, path, readers=4, max_batch=MAX_BATCH):
+        self.path = path
+        self.size = readers
+        self.max_batch = max_batch
+        self._writer = None
+        self._queue = None
+        self._writer_task = None
+        self._readers = None
+        self._opening = None
+        self._connections = []
+        self._trace = None
+        # requests — выданные соединения (в том числе откатившиеся), lock_wait — их суммарное ожидание
+        self.stats = {'transactions': 0, 'writes': 0, 'requests': 0, 'busy_retries': 0, 'lock_wait': 0.0}
+
+    async def _connect(self, readonly=False):
+        # Режим autocommit: транзакции писателя открываются явно в writer()
+        db = await aiosqlite.connect(self.path, isolation_level=None)
+        db.row_factory = aiosqlite.Row
+        pragmas = PRAGMAS + ('PRAGMA query_only = ON',) if readonly else PRAGMAS
+        await db.executescript(';'.join(pragmas))
+        if self._trace is not None:
+            await db.set_trace_callback(self._trace)
+        self._connections.append(db)
+        return db
+
+    async def open(self):
+        """Открыть соединения (повторный вызов ничего не делает)"""
+        if self._writer is not None:
+            return
+        if self._opening is None:
+            self._opening = asyncio.Lock()
+        async with self._opening:
+            if self._writer is not None:
+                return
+            # WAL включается писателем до открытия читателей.
+            # auto_vacuum действует только для нового файла (для старого — maintenance vacuum)
+            writer = await self._connect()
+            await writer.executescript('PRAGMA auto_vacuum = INCREMENTAL; PRAGMA journal_mode = WAL')
+            readers = asyncio.Queue()
+            for db in await asyncio.gather(*(self._connect(readonly=True) for _ in range(self.size))):
+                readers.put_nowait(db)
+            self._queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._run_writer())
+            self._readers = readers
+            self._writer = writer
+
+    async def close(self):
+        """Закрыть все соединения"""
+        if self._writer is None:
+            return
+        # Писатель дорабатывает уже поставленные в очередь запросы
+        self._queue.put_nowait(None)
+        await self._writer_task
+        while not self._readers.empty():
+            await self._readers.get_nowait().close()
+        await self._writer.close()
+        self._connections = []
+        self._writer = None
+        self._queue = None
+        self._writer_task = None
+        self._readers = None
+        self._opening = None
+
+    async def set_trace_callback(self, callback):
+        """sqlite3 trace callback для всех соединений пула, в том числе открытых позже.
+        Вызывается в потоках aiosqlite с текстом каждого выполняемого SQL"""
+        self._trace = callback
+        for db in self._connections:
+            await db.set_trace_callback(callback)
+
+    @property
+    def pending_writes(self):
+        """Запросы на запись, ждущие в очереди писателя"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def warm_up(self):
+        """Открыть соединения и заранее разобрать схему на всех читателях,
+        чтобы первые запросы после старта не платили за это"""
+        await self.open()
+        readers = [await self._readers.get() for _ in range(self.size)]
+        try:
+            # Строки дочитываются: незавершённый запрос держал бы старый снимок БД
+            await asyncio.gather(*(db.execute_fetchall('SELECT COUNT(*) FROM sqlite_master') for db in readers))
+        finally:
+            for db in readers:
+                self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def reader(self):
+        """Соединение только для чтения"""
+        await self.open()
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    async def _begin(self):
+        """BEGIN IMMEDIATE с экспоненциальной паузой при SQLITE_BUSY"""
+        delay = BUSY_BACKOFF
+        for attempt in range(BUSY_RETRIES):
+            try:
+                await self._writer.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if not is_busy(e) or attempt == BUSY_RETRIES - 1:
+                    raise
+                self.stats['busy_retries'] += 1
+                await asyncio.sleep(delay * (1 + random.random()))
+                delay *= 2
+
+    async def _grant(self, request, savepoint):
+        """Отдать соединение одному запросу и дождаться конца его тела.
+        Возвращает True, если изменения запроса остались в транзакции"""
+        if request.granted.done():
+            # Вызывающий отменён, пока ждал очереди. Без savepoint это первый
+            # запрос пачки: уже открытая BEGIN IMMEDIATE закрывается, иначе
+            # RESERVED-блокировка и транзакция остались бы висеть
+            if not savepoint:
+                await self._writer.rollback()
+            return False
+        db = self._writer
+        if savepoint:
+            await db.execute('SAVEPOINT write')
+        request.granted.set_result(db)
+        if await request.finished:
+            if savepoint:
+                await db.execute('RELEASE write')
+            return True
+        if savepoint:
+            # Откатывается только этот запрос, остальные в пачке не затронуты
+            await db.execute('ROLLBACK TO write')
+            await db.execute('RELEASE write')
+        else:
+            await db.rollback()
+        return False
+
+    async def _run_writer(self):
+        """Задача-писатель: BEGIN IMMEDIATE, запросы из очереди, один commit на пачку"""
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            request = await queue.get()
+            if request is None:
+                break
+            if request.granted.done():
+                # Отменён в очереди: транзакцию ради него не открываем
+                continue
+            try:
+                await self._begin()
+            except BaseException as e:
+                _resolve(request.granted, e)
+                continue
+            self.stats['transactions'] += 1
+
+            batch = []
+            try:
+                # Первый запрос без savepoint: при его ошибке откатывается вся (пустая) транзакция
+                if not await self._grant(request, savepoint=False):
+                    continue
+                batch.append(request)
+                # Всё, что накопилось, пока выполнялись предыдущие, идёт в ту же транзакцию
+                while len(batch) < self.max_batch and not queue.empty():
+                    request = queue.get_nowait()
+                    if request is None:
+                        stopping = True
+                        break
+                    if await self._grant(request, savepoint=True):
+                        batch.append(request)
+                await self._writer.commit()
+            except BaseException as e:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+                # Ошибка savepoint/commit: вся пачка и текущий запрос получают её
+                _resolve(request.granted, e)
+                for request in batch + [request]:
+                    _resolve(request.committed, e)
+                if not isinstance(e, Exception):
+                    raise
+                continue
+            self.stats['writes'] += len(batch)
+            for request in batch:
+                _resolve(request.committed)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Пишущее соединение внутри общей транзакции BEGIN IMMEDIATE.
+        Изменения тела атомарны: при ошибке откатываются только они;
+        выход из with возвращает управление после commit всей пачки"""
+        await self.open()
+        started = time.perf_counter()
+        request = _WriteRequest(asyncio.get_running_loop())
+        self._queue.put_nowait(request)
+        try:
+            db = await request.granted
+        except BaseException:
+            # Соединение могло быть выдано в момент отмены — вернуть его писателю
+            if not request.finished.done():
+                request.finished.set_result(False)
+            raise
+        self.stats['requests'] += 1
+        self.stats['lock_wait'] += time.perf_counter() - started
+        try:
+            yield db
+        except BaseException:
+            request.finished.set_result(False)
+            raise
+        request.finished.set_result(True)
+        await request.committed
@@ -0,0 +1,166 @@
+"""Курс USD→RUB для цен лотов в рублях
+
+Источник задаётся RATE_SOURCE: число (фиксированный курс), путь к файлу
+или http(s)-адрес. Файл и ответ сервера — число или JSON в формате
+cbr-xml-daily.ru ({"Valute": {"USD": {"Value": ...}}}).
+Последний курс хранится в БД: после рестарта он известен без сети.
+"""
+import asyncio
+import json
+import logging
+import time
+
+def parse_rate(text):
+    """Курс из текста: число или JSON cbr-xml-daily"""
+    try:
+        return float(text)
+    except ValueError:
+        return float(json.loads(text)['Valute']['USD']['Value'])
+
+class StaticRateSource:
+    """Фиксированный курс (заглушка для офлайна и тестов)"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+
+    async def fetch(self):
+        return self.rate
+
+class FileRateSource:
+    """Курс из локального файла"""
+
+    def __init__(self, path):
+        self.path = path
+
+    async def fetch(self):
+        with open(self.path, encoding='utf-8') as f:
+            return parse_rate(f.read())
+
+class HttpRateSource:
+    """Курс по HTTP (по умолчанию — ЦБ РФ через cbr-xml-daily.ru)"""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    async def fetch(self):
+        # aiohttp нужен только HTTP-источнику: импорт database.py его не загружает
+        import aiohttp
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(self.url) as response:
+                response.raise_for_status()
+                return parse_rate(await response.text())
+
+def make_source(spec):
+    """Источник по строке RATE_SOURCE"""
+    try:
+        return StaticRateSource(float(spec))
+    except ValueError:
+        pass
+    if spec.startswith(('http://', 'https://')):
+        return HttpRateSource(spec)
+    return FileRateSource(spec)
+
+# Строк listings на одну транзакцию пересчёта
+RECOMPUTE_CHUNK = 10_000
+
+class ExchangeRates:
+    """Кэш курса с фоновым обновлением.
+    При заметном изменении курса price_rub активных лотов пересчитывается
+    одним UPDATE на диапазон id, без построчной обработки в Python"""
+
+    def __init__(self, pool, source, interval=3600, min_change=0.001):
+        self.pool = pool
+        self.source = source
+        self.interval = interval
+        self.min_change = min_change
+        self.rate = None
+        self.updated_at = None
+        self._task = None
+        self._stopped = None
+
+    def to_rub(self, price_usd):
+        """Цена в рублях по текущему курсу (None, пока курс неизвестен)"""
+        if self.rate is None or price_usd is None:
+            return None
+        return round(price_usd * self.rate)
+
+    async def load(self):
+        """Последний сохранённый курс"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT rate, updated_at FROM exchange_rates WHERE pair = 'USD_RUB'")
+            row = await cursor.fetchone()
+        if row:
+            self.rate, self.updated_at = row['rate'], row['updated_at']
+        return self.rate
+
+    async def recompute(self, chunk=RECOMPUTE_CHUNK):
+        """Пересчитать price_rub активных лотов. Возвращает число изменённых строк"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute('SELECT MIN(id), MAX(id) FROM listings')
+            low, high = await cursor.fetchone()
+        if low is None:
+            return 0
+
+        updated = 0
+        for start in range(low, high + 1, chunk):
+            async with self.pool.writer() as db:
+                # Курс читается на каждой пачке: пересчёт подхватит обновление на ходу
+                cursor = await db.execute('''
+                    UPDATE listings SET price_rub = CAST(ROUND(price_usd * ?) AS INTEGER)
+                    WHERE id >= ? AND id < ? AND status = 'active'
+                      AND price_rub IS NOT CAST(ROUND(price_usd * ?) AS INTEGER)
+                ''', (self.rate, start, start + chunk, self.rate))
+                updated += cursor.rowcount
+        return updated
+
+    async def set_rate(self, rate):
+        """Применить новый курс: сохранить и, если он заметно изменился, пересчитать цены"""
+        old = self.rate
+        self.rate = rate
+        self.updated_at = time.time()
+        async with self.pool.writer() as db:
+            await db.execute('''
+                INSERT INTO exchange_rates (pair, rate, updated_at) VALUES ('USD_RUB', ?, ?)
+                ON CONFLICT (pair) DO UPDATE SET rate = excluded.rate, updated_at = excluded.updated_at
+            ''', (rate, self.updated_at))
+        if old is None or abs(rate - old) / old >= self.min_change:
+            return await self.recompute()
+        return 0
+
+    async def refresh(self):
+        """Запросить курс у источника. При ошибке остаётся прежний курс"""
+        try:
+            rate = await self.source.fetch()
+        except Exception as e:
+            logging.warning("exchange rate not updated: %s", e)
+            return 0
+        if rate <= 0:
+            logging.warning("exchange rate ignored: %s", rate)
+            return 0
+        return await self.set_rate(rate)
+
+    async def _run(self):
+        while not self._stopped.is_set():
+            try:
+                await self.refresh()
+            except Exception:
+                logging.exception("exchange rate refresh failed")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        """Загрузить сохранённый курс и запустить фоновое обновление"""
+        await self.load()
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
@@ -0,0 +1,71 @@
+"""Многоуровневая статистика рефералов
+
+Прямые рефералы и заработок лежат в строке users (referral_count,
+referral_earnings — поддерживаются триггерами). Глубина дерева считается
+рекурсивным CTE по idx_users_referrer один раз на пользователя и кэшируется;
+новый реферал увеличивает счётчики уровней у уже закэшированных предков
+без повторного обхода дерева.
+"""
+from .cache import LRUCache
+
+# Число рефералов на каждом уровне дерева, начиная с прямых
+TREE_SQL = '''
+    WITH RECURSIVE tree(user_id, level) AS (
+        SELECT user_id, 1 FROM users WHERE referrer_id = ?
+        UNION ALL
+        SELECT u.user_id, tree.level + 1 FROM tree
+        JOIN users u ON u.referrer_id = tree.user_id
+        WHERE tree.level < ?
+    )
+    SELECT level, COUNT(*) FROM tree GROUP BY level
+'''
+
+# Цепочка пригласивших: сам referrer, его referrer и т.д. (не глубже depth)
+ANCESTORS_SQL = '''
+    WITH RECURSIVE up(user_id, level) AS (
+        SELECT ?, 1
+        UNION ALL
+        SELECT u.referrer_id, up.level + 1 FROM up
+        JOIN users u ON u.user_id = up.user_id
+        WHERE up.level < ? AND u.referrer_id IS NOT NULL
+    )
+    SELECT user_id FROM up ORDER BY level
+'''
+
+class ReferralStats:
+    """Кэш числа рефералов по уровням: user_id -> [уровень 1, уровень 2, ...].
+    shared=True (БД пишут несколько процессов) — кэш выключен, каждый запрос идёт в БД"""
+
+    def __init__(self, pool, depth=3, maxsize=10_000, ttl=3600, shared=False):
+        self.pool = pool
+        self.depth = depth
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl, enabled=not shared)
+
+    async def levels(self, user_id):
+        """Рефералы по уровням (список длины depth)"""
+        levels = self.cache.get(user_id)
+        if levels is not None:
+            return levels
+
+        epoch = self.cache.epoch
+        levels = [0] * self.depth
+        async with self.pool.reader() as db:
+            cursor = await db.execute(TREE_SQL, (user_id, self.depth))
+            for level, count in await cursor.fetchall():
+                levels[level - 1] = count
+        self.cache.set(user_id, levels, epoch)
+        return levels
+
+    async def ancestors(self, db, referrer_id):
+        """Предки нового реферала по уровням; вызывается в транзакции create_user"""
+        cursor = await db.execute(ANCESTORS_SQL, (referrer_id, self.depth))
+        return [row[0] for row in await cursor.fetchall()]
+
+    def added(self, ancestors):
+        """Новый реферал зарегистрирован: +1 на соответствующем уровне у каждого предка"""
+        for level, user_id in enumerate(ancestors):
+            levels = self.cache.get(user_id)
+            if levels is not None:
+                levels[level] += 1
+        # Обход дерева, начатый до этой регистрации, не попадёт в кэш
+        self.cache.invalidate()
@@ -0,0 +1,66 @@
+"""Тексты сообщений по заранее подготовленным шаблонам
+
+Шаблоны разбираются один раз при импорте (bound-метод str.format),
+страница собирается одним ''.join без повторных конкатенаций.
+"""
+
+LISTINGS_HEADER = "**📋 ДОСТУПНЫЕ СКИНЫ**\n\n"
+
+_listing_line = (
+    "{0}. **{1}** ({2})\n"
+    "   💰 ${3}{6} | 👤 {4} ⭐{5:.1f}\n\n"
+).format
+
+_listing_detail = (
+    "🎯 **{0}**\n\n"
+    "📦 Качество: **{1}**\n"
+    "💰 Цена: **${2}**{9}\n"
+    "👤 Продавец: **{3}** ⭐{4:.1f}\n"
+    "📊 Float: **{5}**\n"
+    "🎨 Pattern: **{6}**\n"
+    "👀 Просмотров: **{7}**\n"
+    "🔗 Steam: {8}\n"
+).format
+
+_stats_line = "{0}. **{1}** ({2})\n   📈 ${3:.2f} | ${4:.2f}–${5:.2f} | продаж: {6}\n\n".format
+
+def rub(price_rub):
+    """Цена в рублях после долларовой: " (≈ 12 345 ₽)" или пусто, если курса ещё нет"""
+    if price_rub is None:
+        return ""
+    return f" (≈ {price_rub:,} ₽)".replace(",", " ")
+
+def render_listings_page(listings, start=1):
+    """Страница каталога; start — номер первого лота"""
+    return LISTINGS_HEADER + ''.join([
+        _listing_line(
+            i, item['skin_name'], item['quality'], item['price_usd'], item['seller_name'], item['rating'],
+            rub(item['price_rub'])
+        )
+        for i, item in enumerate(listings, start)
+    ])
+
+def render_listing(item, views):
+    """Карточка лота"""
+    return _listing_detail(
+        item['skin_name'], item['quality'], item['price_usd'], item['seller_name'], item['rating'],
+        item['float_value'] or 'N/A', item['pattern'] or 'N/A', views, item['steam_link'],
+        rub(item['price_rub'])
+    )
+
+def render_price_stats(top):
+    """Топ скинов по продажам: медиана и межквартильный диапазон цен"""
+    if not top:
+        return "📊 **СТАТИСТИКА ЦЕН**\n\nПродаж пока не было."
+    return "📊 **СТАТИСТИКА ЦЕН**\n_медиана | p25–p75_\n\n" + ''.join([
+        _stats_line(i, skin_name, quality, median, p25, p75, count)
+        for i, ((skin_name, quality), (count, p25, median, p75)) in enumerate(top, 1)
+    ])
+
+def render_suggestion(suggestion):
+    """Подсказка цены для продавца или пусто, если данных нет"""
+    if suggestion is None:
+        return ""
+    price, (count, p25, _, p75), source = suggestion
+    basis = f"по {count} продажам" if source == 'sales' else f"по {count} активным лотам"
+    return f"💡 Рекомендуемая цена: **${round(price)}** ({basis}, обычно ${p25:.2f}–${p75:.2f})\n\n"
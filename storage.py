@@ -0,0 +1,94 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from .cache import LRUCache
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_states с кэшем в памяти процесса.
+
+    Запись сквозная (кэш и БД сразу), чтение — из кэша. Если бот запущен
+    в нескольких процессах, shared=True: чтение всегда идёт в БД (поиск по PK).
+    Незавершённые сценарии старше ttl секунд считаются пустыми и удаляются."""
+
+    def __init__(self, pool, ttl=24 * 3600, shared=False, cache_size=10_000, purge_interval=3600):
+        self.pool = pool
+        self.ttl = ttl
+        self.shared = shared
+        self.purge_interval = purge_interval
+        self._cache = LRUCache(maxsize=cache_size, ttl=ttl)
+        self._last_purge = time.monotonic()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    async def _load(self, key):
+        """(state, data) из кэша, иначе из БД"""
+        record = None if self.shared else self._cache.get(key)
+        if record is not None:
+            return record
+
+        epoch = self._cache.epoch
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                'SELECT state, data FROM fsm_states WHERE key = ? AND updated_at >= ?',
+                (key, time.time() - self.ttl)
+            )
+            row = await cursor.fetchone()
+        record = (row[0], json.loads(row[1])) if row else (None, {})
+        self._cache.set(key, record, epoch)
+        return record
+
+    async def _save(self, key, state, data):
+        self._cache.set(key, (state, data))
+        async with self.pool.writer() as db:
+            if state is None and not data:
+                await db.execute('DELETE FROM fsm_states WHERE key = ?', (key,))
+            else:
+                await db.execute('''
+                    INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE
+                    SET state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+                ''', (key, state, json.dumps(data, ensure_ascii=False), time.time()))
+
+        if time.monotonic() - self._last_purge > self.purge_interval:
+            self._last_purge = time.monotonic()
+            asyncio.create_task(self.purge_expired())
+
+    async def purge_expired(self):
+        """Удалить брошенные сценарии старше ttl"""
+        try:
+            async with self.pool.writer() as db:
+                cursor = await db.execute(
+                    'DELETE FROM fsm_states WHERE updated_at < ?', (time.time() - self.ttl,)
+                )
+            return cursor.rowcount
+        except Exception:
+            logging.exception("fsm states purge failed")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        key = self._key(key)
+        _, data = await self._load(key)
+        await self._save(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        key = self._key(key)
+        state, _ = await self._load(key)
+        await self._save(key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return data.copy()
+
+    async def close(self) -> None:
+        pass
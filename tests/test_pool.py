@@ -0,0 +1,60 @@
+"""Очередь писателя: отменённые запросы не ломают следующие пачки"""
+import asyncio
+
+from ..pool import ConnectionPool
+
+async def _write(pool, value):
+    async with pool.writer() as db:
+        await db.execute('INSERT INTO t (value) VALUES (?)', (value,))
+
+async def _values(pool):
+    async with pool.reader() as db:
+        rows = await db.execute_fetchall('SELECT value FROM t ORDER BY value')
+    return [row[0] for row in rows]
+
+def run_with_pool(tmp_path, test, **kwargs):
+    async def main():
+        pool = ConnectionPool(str(tmp_path / 'pool.db'), readers=1, **kwargs)
+        try:
+            async with pool.writer() as db:
+                await db.execute('CREATE TABLE t (value INTEGER)')
+            await test(pool)
+        finally:
+            # Потоки aiosqlite не дали бы процессу завершиться
+            await pool.close()
+    asyncio.run(main())
+
+def test_cancelled_first_of_batch_does_not_wedge_writer(tmp_path):
+    async def test(pool):
+        # Пачки по два запроса: третий — первый во второй пачке
+        tasks = [asyncio.create_task(_write(pool, i)) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks[2].cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert isinstance(results[2], asyncio.CancelledError)
+        assert [r for i, r in enumerate(results) if i != 2] == [None, None, None]
+
+        await asyncio.wait_for(_write(pool, 100), 5)
+        assert await _values(pool) == [0, 1, 3, 100]
+
+    run_with_pool(tmp_path, test, max_batch=2)
+
+def test_cancelled_after_begin_is_rolled_back(tmp_path):
+    async def test(pool):
+        # Отмена между BEGIN IMMEDIATE и выдачей соединения
+        begin = pool._begin
+
+        async def begin_then_cancel():
+            await begin()
+            task.cancel()
+            pool._begin = begin
+
+        pool._begin = begin_then_cancel
+        task = asyncio.create_task(_write(pool, 1))
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+
+        await asyncio.wait_for(_write(pool, 2), 5)
+        assert await _values(pool) == [2]
+
+    run_with_pool(tmp_path, test)
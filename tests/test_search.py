@@ -0,0 +1,36 @@
+"""Поиск по listings_fts: порядок цен у границы ключа rowid"""
+import asyncio
+
+from .. import database
+from ..database import pool, init_db, add_listing, search_listings
+from ..migrations import FTS_MAX_CENTS
+
+def run_with_db(tmp_path, test):
+    async def main():
+        old_path = pool.path
+        await pool.close()
+        pool.path = str(tmp_path / 'search.db')
+        try:
+            await init_db()
+            async with pool.writer() as db:
+                await db.execute("INSERT INTO users (user_id, username) VALUES (1, 'seller')")
+            await test()
+        finally:
+            await pool.close()
+            pool.path = old_path
+            database.user_cache.clear()
+    asyncio.run(main())
+
+def test_expensive_listings_sort_after_cheap_ones(tmp_path):
+    boundary = FTS_MAX_CENTS / 100
+    prices = [25_000_000, boundary + 0.01, boundary, boundary - 0.01, 5.0]
+
+    async def test():
+        for price in prices:
+            await add_listing(1, 'AK-47 Redline', 'Field-Tested', price, '')
+        rows = await search_listings('redline', 1)
+        assert [row['price_usd'] for row in rows] == [5.0]
+        rows = await search_listings('redline')
+        assert [row['price_usd'] for row in rows] == sorted(prices)
+
+    run_with_db(tmp_path, test)
@@ -0,0 +1,91 @@
+"""Ограничение частоты апдейтов от одного пользователя
+
+Outer-middleware уровня Update, зарегистрированный перед FSMContextMiddleware:
+лишние апдейты отсекаются до чтения состояния FSM, фильтров и БД.
+Лимиты у каждого процесса свои (в режиме webhook с несколькими
+воркерами пользователь может получить чуть больше).
+"""
+from aiogram import BaseMiddleware
+
+from .cache import LRUCache
+from .notifications import TokenBucket
+
+# (префикс callback_data, токенов в секунду, всплеск). Берётся первый совпавший префикс
+CALLBACK_LIMITS = (
+    ('buy_', 0.5, 2),
+    ('view_', 3, 6),
+    ('page_', 2, 5),
+    ('listings', 2, 5),
+)
+DEFAULT_CALLBACK_LIMIT = (3, 6)
+MESSAGE_LIMIT = (2, 5)
+
+# Пользователь без активности дольше IDLE_TTL забывается, всего хранится не больше MAX_USERS
+IDLE_TTL = 600
+MAX_USERS = 50_000
+
+def limit_for(data):
+    """Ключ бюджета и лимит (rate, capacity) для callback_data"""
+    for prefix, rate, capacity in CALLBACK_LIMITS:
+        if data.startswith(prefix):
+            return prefix, rate, capacity
+    return '', *DEFAULT_CALLBACK_LIMIT
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Token bucket на пользователя и префикс callback_data.
+    Повторное нажатие той же кнопки, пока первое ещё обрабатывается, не выполняется"""
+
+    def __init__(self, max_users=MAX_USERS, idle_ttl=IDLE_TTL):
+        # user_id -> {ключ бюджета: TokenBucket}
+        self.users = LRUCache(maxsize=max_users, ttl=idle_ttl)
+        self.in_flight = set()
+        self.throttled = 0
+        self.coalesced = 0
+
+    def _allow(self, user_id, key, rate, capacity):
+        buckets = self.users.get(user_id)
+        if buckets is None:
+            buckets = {}
+        # Повторный set продлевает TTL и поднимает пользователя в LRU
+        self.users.set(user_id, buckets)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, capacity)
+        return bucket.try_acquire()
+
+    def register(self, dp):
+        """Подключить к диспетчеру перед FSMContextMiddleware (после UserContextMiddleware:
+        event_from_user уже известен)"""
+        outer = dp.update.outer_middleware
+        outer.unregister(dp.fsm)
+        outer.register(self)
+        outer.register(dp.fsm)
+
+    async def __call__(self, handler, event, data):
+        # event — Update; ограничиваются только сообщения и нажатия кнопок
+        user = data.get('event_from_user')
+        if user is None or (event.message is None and event.callback_query is None):
+            return await handler(event, data)
+
+        callback = event.callback_query
+        if callback is None:
+            if self._allow(user.id, 'message', *MESSAGE_LIMIT):
+                return await handler(event, data)
+            self.throttled += 1
+            return None
+
+        key = (user.id, callback.data)
+        if key in self.in_flight:
+            self.coalesced += 1
+            await callback.answer("⏳ Уже обрабатывается")
+            return None
+        if not self._allow(user.id, *limit_for(callback.data or '')):
+            self.throttled += 1
+            await callback.answer("⏳ Слишком часто, подожди немного")
+            return None
+
+        self.in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight.discard(key)
@@ -0,0 +1,67 @@
+"""Гистограммы задержек и обёртка instrumented() для database.py
+
+Модуль без внешних зависимостей: импорт database.py не тянет aiogram
+и aiohttp. Сервер и middleware метрик живут в metrics.py.
+"""
+import bisect
+import time
+from functools import wraps
+
+# Флаг включает metrics.setup_metrics(); обёртки database.py проверяют его на каждом вызове
+enabled = False
+
+# Границы корзин в секундах
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROWS_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500, 1000)
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и одной меткой"""
+
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        # значение метки -> [счётчики по корзинам..., +Inf, сумма]
+        self.values = {}
+
+    def observe(self, label_value, value):
+        row = self.values.get(label_value)
+        if row is None:
+            row = self.values[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_value, row in sorted(self.values.items()):
+            label = f'{self.label}="{label_value}"'
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), row):
+                total += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {total}')
+            lines.append(f'{self.name}_sum{{{label}}} {row[-1]}')
+            lines.append(f'{self.name}_count{{{label}}} {total}')
+        return lines
+
+handler_seconds = Histogram('bot_handler_seconds', 'Время обработчика апдейта', 'handler')
+telegram_seconds = Histogram('bot_telegram_request_seconds', 'Время запроса к Bot API', 'method')
+query_seconds = Histogram('bot_db_query_seconds', 'Время запроса к БД', 'query')
+query_rows = Histogram('bot_db_query_rows', 'Строк в ответе запроса к БД', 'query', ROWS_BUCKETS)
+HISTOGRAMS = (handler_seconds, telegram_seconds, query_seconds, query_rows)
+
+def instrumented(func):
+    """Обёртка функций database.py: время и число строк (если вернулся список)"""
+    name = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not enabled:
+            return await func(*args, **kwargs)
+        started = time.perf_counter()
+        result = await func(*args, **kwargs)
+        query_seconds.observe(name, time.perf_counter() - started)
+        if isinstance(result, list):
+            query_rows.observe(name, len(result))
+        return result
+    return wrapper
@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import json
+import logging
+from datetime import datetime
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Сколько ближайших окончаний держать в памяти; следующие дочитываются по индексу
+PRELOAD = 10_000
+# Даже без событий перепроверять очередь не реже раза в час
+MAX_SLEEP = 3600
+# Пауза перед повтором после ошибки записи
+RETRY_DELAY = 5
+
+class VipScheduler:
+    """Снятие VIP точно в момент окончания.
+    Ближайшие vip_until лежат в min-heap (загружаются по индексу idx_users_vip_until),
+    наступившие снимаются одним UPDATE на пачку, пользователям ставится уведомление.
+    Продление не удаляет старую запись из кучи: UPDATE проверяет vip_until и её пропустит"""
+
+    def __init__(self, pool, cache=None, preload=PRELOAD):
+        self.pool = pool
+        self.cache = cache
+        self.preload = preload
+        self._heap = []
+        # Самое позднее загруженное окончание; None — в куче все VIP
+        self._horizon = None
+        self._reload = True
+        self._loading = False
+        self._wakeup = None
+        self._task = None
+        self._stopped = None
+
+    def schedule(self, user_id, vip_until):
+        """Учесть новое окончание VIP (после активации или продления)"""
+        if self._loading:
+            # Снимок окна мог быть прочитан до этой активации — перечитаем
+            self.refresh()
+            return
+        if self._reload or (self._horizon is not None and vip_until > self._horizon):
+            # Попадёт в кучу при следующей загрузке окна
+            return
+        heapq.heappush(self._heap, (vip_until, user_id))
+        if self._wakeup is not None and self._heap[0][1] == user_id:
+            self._wakeup.set()
+
+    def refresh(self):
+        """Перечитать окно из БД (после массовой выдачи VIP)"""
+        self._reload = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def load(self):
+        """Загрузить ближайшие окончания по индексу"""
+        self._reload = False
+        self._loading = True
+        try:
+            async with self.pool.reader() as db:
+                cursor = await db.execute('''
+                    SELECT vip_until, user_id FROM users
+                    WHERE vip_status = 1 AND vip_until IS NOT NULL
+                    ORDER BY vip_until
+                    LIMIT ?
+                ''', (self.preload,))
+                rows = [tuple(row) for row in await cursor.fetchall()]
+        finally:
+            self._loading = False
+        self._heap = rows  # уже отсортировано — это корректная куча
+        self._horizon = rows[-1][0] if len(rows) == self.preload else None
+
+    async def expire_due(self, now=None):
+        """Снять VIP у всех, чей срок наступил. Возвращает их user_id"""
+        now = now or datetime.now().strftime(TIME_FORMAT)
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap))
+        if not due:
+            return []
+
+        try:
+            async with self.pool.writer() as db:
+                cursor = await db.execute('''
+                    UPDATE users SET vip_status = 0
+                    WHERE user_id IN (SELECT value FROM json_each(?))
+                      AND vip_status = 1 AND vip_until <= ?
+                    RETURNING user_id
+                ''', (json.dumps([user_id for _, user_id in due]), now))
+                expired = [row[0] for row in await cursor.fetchall()]
+                await db.executemany('''
+                    INSERT INTO notifications (user_id, type, title, message)
+                    VALUES (?, 'vip_expired', ?, ?)
+                ''', [
+                    (user_id, "👑 VIP закончился", "Срок VIP истёк. Продли его в разделе «Баланс».")
+                    for user_id in expired
+                ])
+        except BaseException:
+            # Записи возвращаются в кучу: следующий проход снимет их снова,
+            # UPDATE не тронет тех, кого уже сняли или продлили
+            for entry in due:
+                heapq.heappush(self._heap, entry)
+            raise
+        if self.cache is not None and expired:
+            self.cache.invalidate(*expired)
+        return expired
+
+    def _delay(self):
+        if not self._heap:
+            # Окно кончилось, но в БД есть ещё — дочитать сразу
+            return MAX_SLEEP if self._horizon is None else 0
+        until = datetime.strptime(self._heap[0][0][:19], TIME_FORMAT)
+        return min(max((until - datetime.now()).total_seconds(), 0), MAX_SLEEP)
+
+    async def _run(self):
+        while not self._stopped.is_set():
+            # Сброс до работы: schedule() во время загрузки или UPDATE не потеряется
+            self._wakeup.clear()
+            try:
+                if self._reload or (not self._heap and self._horizon is not None):
+                    await self.load()
+                await self.expire_due()
+                delay = self._delay()
+            except Exception:
+                logging.exception("vip expiry failed")
+                # Наступившие сроки остались в куче: без паузы цикл повторял бы ошибку вхолостую
+                delay = RETRY_DELAY
+            sleeper = asyncio.ensure_future(self._wakeup.wait())
+            stopper = asyncio.ensure_future(self._stopped.wait())
+            await asyncio.wait((sleeper, stopper), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            sleeper.cancel()
+            stopper.cancel()
+
+    def start(self):
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановить планировщик (текущая пачка дописывается)"""
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
+            self._wakeup = None
@@ -0,0 +1,190 @@
+"""JSON API для WebApp-магазина
+
+Каждый запрос подписан initData (заголовок Authorization: tma <initData>).
+Первая страница лотов отдаётся из снимка в памяти с ETag, поэтому частый
+опрос витрины не трогает SQLite.
+Запуск отдельно: python -m bot.webapp
+"""
+import asyncio
+import hashlib
+import json
+import logging
+
+from aiohttp import web
+
+from .cache import LRUCache
+from .config import BOT_TOKEN, WEBSITE_URL, WEBAPP_HOST, WEBAPP_PORT
+from .database import pool, get_user, get_listing, get_active_listings
+from .utils import verify_telegram_auth, decode_cursor, encode_cursor
+
+PAGE_SIZE = 50
+SNAPSHOT_INTERVAL = 2.0
+
+# Проверенные initData: повторные запросы витрины не пересчитывают HMAC
+auth_cache = LRUCache(maxsize=10_000, ttl=60)
+
+LISTING_FIELDS = (
+    'id', 'seller_id', 'seller_name', 'rating', 'skin_name', 'quality', 'price_usd', 'price_rub',
+    'steam_link', 'image_url', 'float_value', 'pattern', 'views', 'created_at'
+)
+
+def listing_json(row):
+    return {field: row[field] for field in LISTING_FIELDS}
+
+def json_body(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+
+def etag_of(body):
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+class ListingsSnapshot:
+    """Первая страница активных лотов, заранее сериализованная в JSON.
+    Перестраивается в фоне; версия растёт только при изменении содержимого"""
+
+    def __init__(self, interval=SNAPSHOT_INTERVAL):
+        self.interval = interval
+        self.version = 0
+        self.body = b''
+        self.etag = None
+        self.by_id = {}
+        self._task = None
+
+    async def refresh(self):
+        listings = await get_active_listings(PAGE_SIZE + 1)
+        items = [listing_json(row) for row in listings[:PAGE_SIZE]]
+        next_cursor = encode_cursor(listings[PAGE_SIZE - 1]) if len(listings) > PAGE_SIZE else None
+        body = json_body({'items': items, 'next': next_cursor})
+        etag = etag_of(body)
+        if etag != self.etag:
+            self.version += 1
+            self.body, self.etag = body, etag
+            self.by_id = {item['id']: item for item in items}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logging.exception("listings snapshot refresh failed")
+
+    async def start(self, app=None):
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, app=None):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+snapshot = ListingsSnapshot()
+
+def cached_response(request, body, etag):
+    """200 с ETag или 304, если у клиента та же версия"""
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag in request.headers.get('If-None-Match', ''):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type='application/json', headers=headers)
+
+def authenticate(request):
+    """Пользователь из подписанного initData или None"""
+    header = request.headers.get('Authorization', '')
+    init_data = header[4:] if header.startswith('tma ') else request.headers.get('X-Telegram-Init-Data')
+    if not init_data:
+        return None
+    user = auth_cache.get(init_data)
+    if user is None:
+        raw_user = verify_telegram_auth(init_data, BOT_TOKEN)
+        if raw_user is None:
+            return None
+        user = json.loads(raw_user)
+        auth_cache.set(init_data, user)
+    return user
+
+@web.middleware
+async def auth_middleware(request, handler):
+    if request.method == 'OPTIONS':
+        response = web.Response()
+    else:
+        request['user'] = authenticate(request)
+        if request['user'] is None:
+            response = web.json_response({'error': 'unauthorized'}, status=401)
+        else:
+            response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = WEBSITE_URL
+    response.headers['Access-Control-Allow-Headers'] = 'Authorization, X-Telegram-Init-Data, If-None-Match'
+    response.headers['Access-Control-Expose-Headers'] = 'ETag'
+    return response
+
+async def listings(request):
+    cursor = request.query.get('after')
+    if not cursor:
+        return cached_response(request, snapshot.body, snapshot.etag)
+
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        return web.json_response({'error': 'bad cursor'}, status=400)
+    rows = await get_active_listings(PAGE_SIZE + 1, after=after)
+    body = json_body({
+        'items': [listing_json(row) for row in rows[:PAGE_SIZE]],
+        'next': encode_cursor(rows[PAGE_SIZE - 1]) if len(rows) > PAGE_SIZE else None,
+    })
+    return cached_response(request, body, etag_of(body))
+
+async def listing_detail(request):
+    try:
+        listing_id = int(request.match_info['listing_id'])
+    except ValueError:
+        raise web.HTTPNotFound()
+    item = snapshot.by_id.get(listing_id)
+    if item is None:
+        row = await get_listing(listing_id)
+        if row is None:
+            return web.json_response({'error': 'not found'}, status=404)
+        item = listing_json(row)
+    body = json_body(item)
+    return cached_response(request, body, etag_of(body))
+
+async def profile(request):
+    user = await get_user(request['user']['id'])
+    if user is None:
+        return web.json_response({'error': 'not found'}, status=404)
+    return web.json_response({
+        'user_id': user['user_id'],
+        'username': user['username'],
+        'balance_coins': user['balance_coins'],
+        'vip_status': bool(user['vip_status']),
+        'vip_until': user['vip_until'],
+        'rating': user['rating'],
+        'rating_count': user['rating_count'],
+        'total_sales': user['total_sales'],
+        'total_purchases': user['total_purchases'],
+    })
+
+async def preflight(request):
+    return web.Response()
+
+def setup_webapp(app):
+    """Подключить API к существующему aiohttp-приложению (например, к webhook-серверу)"""
+    api = web.Application(middlewares=[auth_middleware])
+    api.router.add_get('/listings', listings)
+    api.router.add_get('/listings/{listing_id}', listing_detail)
+    api.router.add_get('/me', profile)
+    api.router.add_route('OPTIONS', '/{tail:.*}', preflight)
+    app.add_subapp('/api', api)
+    app.on_startup.append(snapshot.start)
+    app.on_cleanup.append(snapshot.stop)
+    return app
+
+async def _close_pool(app):
+    await pool.close()
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    app = setup_webapp(web.Application())
+    app.on_cleanup.append(_close_pool)
+    web.run_app(app, host=WEBAPP_HOST, port=WEBAPP_PORT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Режим webhook: aiohttp-сервер с проверкой секретного токена
+
+Запуск: python -m bot.webhook
+WEBHOOK_WORKERS процессов слушают один порт (SO_REUSEPORT), вебхук
+регистрируется один раз в главном процессе до их запуска.
+"""
+import asyncio
+import logging
+import multiprocessing
+
+import time
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from .boot import create_dispatcher
+from .config import (
+    BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_WORKERS, WEBHOOK_SECRET,
+    METRICS_PORT
+)
+from .database import pool, init_db
+from .handlers import router
+from .webapp import setup_webapp
+
+def create_app(bot, dp, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET):
+    """aiohttp-приложение: запросы без верного секретного токена получают 401.
+    Тот же сервер отдаёт API WebApp по /api"""
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret_token).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    setup_webapp(app)
+    return app
+
+async def register_webhook():
+    """Подготовка в главном процессе: схема БД и регистрация вебхука в Telegram"""
+    await init_db()
+    await pool.close()
+    bot = Bot(token=BOT_TOKEN)
+    try:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=router.resolve_used_update_types(),
+        )
+    finally:
+        await bot.session.close()
+
+def serve(reuse_port=False, worker=0):
+    """Один процесс-обработчик. Метрики каждого процесса — на своём порту METRICS_PORT + worker.
+    Уведомления и сверку счётчиков ведёт только воркер 0"""
+    started = time.perf_counter()
+    logging.basicConfig(level=logging.INFO)
+    bot = Bot(token=BOT_TOKEN)
+    dp = create_dispatcher(METRICS_PORT and METRICS_PORT + worker, primary=worker == 0, started=started)
+    app = create_app(bot, dp)
+    web.run_app(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT, reuse_port=reuse_port, print=None)
+
+def main():
+    if not WEBHOOK_URL:
+        raise ValueError("❌ НЕТ WEBHOOK_URL! Для webhook-режима задайте публичный адрес бота")
+
+    asyncio.run(register_webhook())
+    if WEBHOOK_WORKERS <= 1:
+        serve()
+        return
+
+    ctx = multiprocessing.get_context('spawn')
+    workers = [ctx.Process(target=serve, args=(True, i)) for i in range(WEBHOOK_WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+if __name__ == "__main__":
+    main()